@@ -1,7 +1,6 @@
 #!/bin/python3
 
 # from sklearn.metrics import confusion_matrix
-import timeit
 import re
 import numpy as np
 import pandas as pd
@@ -9,41 +8,14 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import colorcet as cc
 import matplotlib.colors
-from functools import wraps
-
-
-# Decorator for timing functions.
-def timeUsage(func):
-    """
-    INPUT:
-        func	obj, function you want timed
-
-    This is a decorator that prints out the duration of execution for a
-    function. Formats differ for cases < 1 min, < 1 hour and >= 1 hour.
-    """
-
-    @wraps(func)
-    def _timeUsage(*args, **kwds):
-
-        t0 = timeit.default_timer()
-
-        retval = func(*args, **kwds)
-
-        t1 = timeit.default_timer()
-        Δt = t1 - t0
-        if Δt > 86400.0:
-            print(f"Δt: {Δt//86400}d, {int((Δt % 86400)//3600)}h, "
-                  f"{int((Δt % 3600)//60)}m, {Δt % 60.0:4.1f}s.")
-        elif Δt > 3600.0:
-            print(f"Δt: {int(Δt//3600)}h, {int((Δt % 3600)//60)}m, "
-                  f"{Δt % 60.0:4.1f}s.")
-        elif Δt > 60.0:
-            print(f"Δt: {int(Δt//60)}m, {Δt % 60.0:4.1f}s.")
-        else:
-            print(f"Δt: {Δt % 60.0:5.2f}s.")
-        return retval
-
-    return _timeUsage
+try:
+    from ..utility.timing import timeUsage
+except ImportError:
+    # Imported as a flat module, from its own directory.
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).resolve().parents[1] / 'utility'))
+    from timing import timeUsage
 
 
 @timeUsage
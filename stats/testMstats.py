@@ -1,5 +1,7 @@
 from mstats import *
+import numpy as np
 import pandas as pd
+import timeit
 
 
 def testAvgMedDatetime(capsys):
@@ -22,3 +24,162 @@ def testAvgMedDatetime(capsys):
     assert dtAvg == expectedDtAvg
     assert dtMed == expectedDtMed
     assert captured.out == "nulls: 3, original: 7, final: 4\n"
+
+
+def testAvgMedDatetimeMatchesList():
+
+    # Compares against the original filter + list of Timedeltas version,
+    # and prints the timing of each.
+    randState = np.random.RandomState(20)
+    for n in [1, 2, 7, 200000]:
+        ns = randState.randint(pd.Timestamp('1990-01-01').value,
+                               pd.Timestamp('2030-01-01').value, size=n,
+                               dtype='int64')
+        dtSeries = pd.Series(pd.to_datetime(ns))
+        if n > 2:
+            dtSeries[randState.choice(n, n//10 + 1, replace=False)] = pd.NaT
+
+        t0 = timeit.default_timer()
+        dtMin = dtSeries.min()
+        Δs = [(dt - dtMin) for dt in
+              filter(lambda dt: not pd.isnull(dt), dtSeries)]
+        expectedDtAvg = dtMin + pd.Series(Δs).mean()
+        expectedDtMed = dtMin + pd.Series(Δs).median()
+        t1 = timeit.default_timer()
+        dtAvg, dtMed = avgMedDatetime(dtSeries)
+        t2 = timeit.default_timer()
+        print(f"n: {n}\tlist: {t1 - t0:6.3f}s\tint64: {t2 - t1:6.3f}s")
+
+        # pandas sums nanoseconds as float64, so can be off by a few
+        # hundred ns; exact integer arithmetic agrees to the ns.
+        assert abs(dtAvg - expectedDtAvg) < pd.Timedelta(1, unit='us')
+        assert abs(dtMed - expectedDtMed) < pd.Timedelta(1, unit='us')
+        finite = sorted(int(dt.value - dtMin.value) for dt in
+                        dtSeries.dropna())
+        assert dtAvg == dtMin + pd.Timedelta(sum(finite)//len(finite),
+                                             unit='ns')
+        assert dtMed == dtMin + pd.Timedelta(
+            (finite[(len(finite) - 1)//2] + finite[len(finite)//2])//2,
+            unit='ns')
+
+    dtSeries = pd.Series(pd.date_range('2005-01-21', periods=4,
+                                       tz='US/Eastern'))
+    assert avgMedDatetime(dtSeries) == \
+        (pd.Timestamp('2005-01-22 12:00', tz='US/Eastern'),)*2
+    assert avgMedDatetime(pd.Series([pd.NaT, pd.NaT])) == (pd.NaT, pd.NaT)
+
+
+def testGroupedDatetimeStats():
+
+    # Compares against a loop of avgMedDatetime() calls and pandas
+    # reductions per group, and prints the timing of each.
+    randState = np.random.RandomState(21)
+    n, nGroups = 100000, 500
+    ns = randState.randint(pd.Timestamp('2000-01-01').value,
+                           pd.Timestamp('2020-01-01').value, size=n,
+                           dtype='int64')
+    df = pd.DataFrame({'device': randState.randint(0, nGroups, size=n),
+                       'seen': pd.to_datetime(ns)})
+    df.loc[randState.choice(n, n//20, replace=False), 'seen'] = pd.NaT
+    df.loc[df['device'] == 7, 'seen'] = pd.NaT
+
+    t0 = timeit.default_timer()
+    expected = {}
+    for device, group in df.groupby('device'):
+        expected[device] = avgMedDatetime(group['seen'])
+    t1 = timeit.default_timer()
+    dtStats = groupedDatetimeStats(df, 'device', 'seen',
+                                   percentiles=(0.1, 0.5, 0.99))
+    t2 = timeit.default_timer()
+    print(f"per-group loop: {t1 - t0:6.3f}s\tgrouped: {t2 - t1:6.3f}s")
+
+    assert list(dtStats.columns) == ['count', 'nulls', 'mean', 'median',
+                                     'min', 'max', '10%', '50%', '99%']
+    assert dtStats.index.equals(pd.Index(np.arange(nGroups), name='device'))
+    assert dtStats['count'].equals(df.groupby('device')['seen'].count())
+    assert (dtStats['count'] + dtStats['nulls']).equals(
+        df.groupby('device').size())
+    allNull = set(df.groupby('device')['seen'].count().loc[lambda c: c == 0]
+                  .index)
+    assert allNull == {7}
+    for device, (dtAvg, dtMed) in expected.items():
+        if device in allNull:
+            assert dtStats.loc[device, 'mean'] is pd.NaT
+            assert dtStats.loc[device, 'median'] is pd.NaT
+        else:
+            assert dtStats.loc[device, 'mean'] == dtAvg
+            assert dtStats.loc[device, 'median'] == dtMed
+    assert dtStats.loc[7].isna().sum() == 9 - 2
+    assert ((dtStats['median'] - dtStats['50%']).abs().dropna()
+            < pd.Timedelta(1, unit='us')).all()
+    assert dtStats['min'].equals(df.groupby('device')['seen'].min())
+    assert dtStats['max'].equals(df.groupby('device')['seen'].max())
+    quantiles = df.groupby('device')['seen'].apply(lambda s:
+                                                   s.quantile(0.99))
+    assert ((dtStats['99%'] - quantiles).abs().dropna()
+            < pd.Timedelta(1, unit='us')).all()
+
+    df['seen'] = df['seen'].dt.tz_localize('UTC').dt.tz_convert('Asia/Tokyo')
+    tzStats = groupedDatetimeStats(df, ['device'], 'seen', percentiles=())
+    assert tzStats['mean'].dt.tz_convert('UTC').dt.tz_localize(None)\
+        .equals(dtStats['mean'])
+
+
+def testDatetimeAccumulator():
+
+    randState = np.random.RandomState(22)
+    n = 400000
+    ns = randState.randint(pd.Timestamp('2015-01-01').value,
+                           pd.Timestamp('2016-01-01').value, size=n,
+                           dtype='int64')
+    # Skewed, so mean and median differ.
+    ns = np.sort(ns)[np.sqrt(randState.random_sample(n)*n**2).astype(int)]
+    dtSeries = pd.Series(pd.to_datetime(ns))
+    dtSeries[randState.choice(n, 1000, replace=False)] = pd.NaT
+
+    # Two partitions, summarized separately, then merged.
+    t0 = timeit.default_timer()
+    accumulators = [DatetimeAccumulator(), DatetimeAccumulator(seed=5)]
+    for i, lo in enumerate(range(0, n, 25000)):
+        accumulators[i % 2].update(dtSeries[lo:lo + 25000])
+    summary = accumulators[0].merge(accumulators[1]).result((0.1, 0.9))
+    t1 = timeit.default_timer()
+    dtAvg, dtMed = avgMedDatetime(dtSeries)
+    t2 = timeit.default_timer()
+    print(f"accumulator: {t1 - t0:6.3f}s\tavgMedDatetime: {t2 - t1:6.3f}s")
+
+    assert summary['count'] == n - 1000 and summary['nulls'] == 1000
+    assert summary['mean'] == dtAvg
+    assert summary['min'] == dtSeries.min()
+    assert summary['max'] == dtSeries.max()
+    assert sum(len(items) for items in accumulators[0].levels) < 2000
+    finite = np.sort(dtSeries.dropna().to_numpy())
+    for name, q in [('median', 0.5), ('10%', 0.1), ('90%', 0.9)]:
+        rank = np.searchsorted(finite, summary[name].to_datetime64())
+        assert abs(rank/len(finite) - q) < 1.7/200
+    assert abs((summary['median'] - dtMed).total_seconds()) < 7*86400
+
+    # Rank errors within 1.7/k over several seeds, on streams fed in small
+    # chunks, with the sketch about full: about k/(1 - 2/3) items.
+    stream = ns[:200000]
+    finite = np.sort(stream)
+    qs = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+    for seed in range(8):
+        accumulator = DatetimeAccumulator(seed=seed)
+        for lo in range(0, len(stream), 1000):
+            accumulator.update(pd.to_datetime(stream[lo:lo + 1000]))
+        assert 2*200 < sum(len(items) for items in accumulator.levels) \
+            < 4*200
+        for q in qs:
+            dt = accumulator.quantile(q).value
+            lo = np.searchsorted(finite, dt, side='left')
+            hi = np.searchsorted(finite, dt, side='right')
+            rank = min(max(q*len(finite), lo), hi)
+            assert abs(rank/len(finite) - q) < 1.7/200
+
+    accumulator = DatetimeAccumulator()
+    assert accumulator.result(())['mean'] is pd.NaT
+    accumulator.update(pd.Series(pd.date_range('2005-01-21', periods=4,
+                                               tz='US/Eastern')))
+    assert accumulator.result(())['mean'] == \
+        pd.Timestamp('2005-01-22 12:00', tz='US/Eastern')
@@ -1,57 +1,216 @@
-import timeit
+import os
+import re
+import errno
+import shutil
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import pickle
+import csv
+import json
 from string import punctuation
 from sklearn.model_selection import train_test_split
 import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
 from pathlib import Path
 from random import random, shuffle
-from collections import OrderedDict
-from functools import wraps
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from queue import Queue, Empty
+import threading
 from nltk.tokenize import RegexpTokenizer
+try:
+    from .timing import (timeUsage, timingRegistry, TimingRegistry,
+                         formatDuration)
+except ImportError:
+    from timing import (timeUsage, timingRegistry, TimingRegistry,
+                        formatDuration)
 
 
-# Decorator for timing functions.
-def timeUsage(func):
+def relocateFiles(sources, dests, how='rename', nWorkers=8, batchSz=256,
+                  dryRun=False, journalPath=None, removeEmpty=True,
+                  volubility=1):
     """
     INPUT:
-        func	obj, function you want timed
+        sources		list(type=str or Path), files to relocate
+        dests		list(type=str or Path), aligned with sources; None (or
+                        '') means leave the source where it is, only checking
+                        whether it is empty
+        how		str, one of 'rename', 'hardlink' or 'copy'. Renames
+                        and hard links that cross devices fall back to
+                        copying (and, for 'rename', removing the source).
+                        Default: 'rename'
+        nWorkers	int, number of threads, default: 8
+        batchSz		int, files handled per thread task, default: 256
+        dryRun		bool, if True, only stat the sources and report what
+                        would be done, default: False
+        journalPath	str or Path, if not None, the plan and the status of
+                        each completed relocation are appended to this file,
+                        one JSON list per line, so that an interrupted run
+                        can be resumed with readRelocationJournal(). The
+                        journal is deleted once every file has been handled
+                        without error. Default: None
+        removeEmpty	bool, if True, empty sources are deleted rather than
+                        relocated, default: True
+        volubility	int, default: 1
 
-    This is a decorator that prints out the duration of execution for a
-    function. Formats differ for cases < 1 min, < 1 hour, < 1 day and >= 1 day.
+    RETURNS:
+        status		np.ndarray(type=object), aligned with sources, one of
+                          'done', relocated (or would be, if dryRun);
+                          'kept', not empty and with no destination;
+                          'empty', removed (or would be, if dryRun);
+                          'failed', see errors
+        errors		list(type=tuple), (source, dest, error message) for
+                        each failure. Failures don't abort the run.
     """
 
-    @wraps(func)
-    def _timeUsage(*args, **kwds):
-
-        t0 = timeit.default_timer()
+    if how not in ['rename', 'hardlink', 'copy']:
+        raise ValueError(f"You supplied how: {how}, but it must be one of"
+                         " ['rename', 'hardlink', 'copy'].")
+
+    sources = [os.fspath(src) for src in sources]
+    dests = [os.fspath(dest) if dest else '' for dest in dests]
+    if len(sources) != len(dests):
+        raise ValueError(f"len(sources): {len(sources)} != len(dests): "
+                         f"{len(dests)}.")
+    status = np.full(len(sources), '', dtype=object)
+
+    journal = None
+    if journalPath is not None and not dryRun:
+        if Path(journalPath).exists():
+            journaled, journaledDests, status = \
+                readRelocationJournal(journalPath)
+            if journaled != sources or journaledDests != dests:
+                raise ValueError(f"{journalPath} records a different plan;"
+                                 " delete it to start afresh.")
+            journal = open(journalPath, 'a', newline='\n')
+        else:
+            journal = open(journalPath, 'w', newline='\n')
+            journal.writelines(json.dumps(['P', src, dest]) + '\n'
+                               for src, dest in zip(sources, dests))
+            journal.flush()
+    done = status != ''
+
+    if not dryRun:
+        for destDir in {os.path.dirname(dest) for dest in dests if dest}:
+            os.makedirs(destDir, exist_ok=True)
+
+    def relocate(src, dest):
+        try:
+            size = os.stat(src).st_size
+        except FileNotFoundError:
+            # Relocated before an interruption, but not yet journaled.
+            if dest and how == 'rename' and os.path.exists(dest):
+                return 'done'
+            raise
+        if removeEmpty and size == 0:
+            if not dryRun:
+                os.unlink(src)
+            return 'empty'
+        if not dest:
+            return 'kept'
+        if dryRun:
+            return 'done'
+        try:
+            if how == 'rename':
+                os.rename(src, dest)
+            elif how == 'hardlink':
+                os.link(src, dest)
+            else:
+                shutil.copy2(src, dest)
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+            shutil.copy2(src, dest)
+            if how == 'rename':
+                os.unlink(src)
+        return 'done'
+
+    def relocateBatch(start):
+        results = []
+        for i in range(start, min(start + batchSz, len(sources))):
+            if done[i]:
+                continue
+            try:
+                results.append((i, relocate(sources[i], dests[i]), None))
+            except OSError as err:
+                results.append((i, 'failed', str(err)))
+        return results
+
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=nWorkers) as pool:
+            for results in pool.map(relocateBatch,
+                                    range(0, len(sources), batchSz)):
+                for i, result, err in results:
+                    status[i] = result
+                    if err is not None:
+                        errors.append((sources[i], dests[i], err))
+                if journal is not None:
+                    journal.writelines(json.dumps(['D', i, result]) + '\n'
+                                       for i, result, err in results
+                                       if result != 'failed')
+                    journal.flush()
+    finally:
+        if journal is not None:
+            journal.close()
+    if journal is not None and len(errors) == 0:
+        os.unlink(journalPath)
 
-        retval = func(*args, **kwds)
+    if volubility > 0:
+        verb = 'Would relocate' if dryRun else 'Relocated'
+        print(f"{verb} {np.count_nonzero(status == 'done')} of "
+              f"{len(sources)} files ({how}); "
+              f"{np.count_nonzero(status == 'empty')} empty, "
+              f"{np.count_nonzero(status == 'kept')} kept, "
+              f"{len(errors)} failed.")
+        if np.count_nonzero(done) > 0:
+            print(f"{np.count_nonzero(done)} were already done, per "
+                  f"{journalPath}.")
+        for src, dest, err in errors[:10]:
+            print(f"Failed: {src} --> {dest}: {err}")
+
+    return status, errors
+
+
+def readRelocationJournal(journalPath):
+    """
+    INPUT:
+        journalPath	str or Path, written by relocateFiles()
 
-        t1 = timeit.default_timer()
-        Δt = t1 - t0
-        if Δt > 86400.0:
-            print(f"Δt: {Δt//86400}d, {int((Δt % 86400)//3600)}h, "
-                  f"{int((Δt % 3600)//60)}m, {Δt % 60.0:4.1f}s.")
-        elif Δt > 3600.0:
-            print(f"Δt: {int(Δt//3600)}h, {int((Δt % 3600)//60)}m, "
-                  f"{Δt % 60.0:4.1f}s.")
-        elif Δt > 60.0:
-            print(f"Δt: {int(Δt//60)}m, {Δt % 60.0:4.1f}s.")
-        else:
-            print(f"Δt: {Δt % 60.0:5.2f}s.")
-        return retval
+    RETURNS:
+        sources		list(type=str)
+        dests		list(type=str), '' where the source stays put
+        status		np.ndarray(type=object), the status relocateFiles()
+                        returned for each completed relocation ('done',
+                        'kept' or 'empty'), or '' where it is still to do
+    """
 
-    return _timeUsage
+    sources = []
+    dests = []
+    completed = {}
+    with open(journalPath, 'r') as journal:
+        for line in journal:
+            # A line cut short by an interruption lacks its newline.
+            if not line.endswith('\n'):
+                break
+            entry = json.loads(line)
+            if entry[0] == 'P':
+                sources.append(entry[1])
+                dests.append(entry[2])
+            else:
+                completed[entry[1]] = entry[2]
+    status = np.full(len(sources), '', dtype=object)
+    status[list(completed)] = list(completed.values())
+    return sources, dests, status
 
 
 @timeUsage
 def moveValidationSubsets(classDirs, headDir='./data', trainDir='train',
                           validationDir='validation', testDir=None,
                           validateFrac=0.20, testFrac=None, fileSuffix='jpg',
-                          testOnly=False):
+                          testOnly=False, journalPath=None, nWorkers=8,
+                          volubility=1):
     """
     INPUT:
         classDirs	list(type=str), list of sub-directories, one for each
@@ -71,6 +230,13 @@ def moveValidationSubsets(classDirs, headDir='./data', trainDir='train',
         testOnly	bool, set True if only want to generate names of files
                         that would be moved into each validation sub-directory.
                         No files will actually be moved. Default: False
+        journalPath	str or Path, if not None, the planned moves are
+                        journaled there by relocateFiles(). If the journal
+                        already exists, an interrupted run is resumed from
+                        it, instead of starting a new split. Default: None
+        nWorkers	int, number of threads moving files, default: 8
+        volubility	int, set > 1 to print every selected file name,
+                        default: 1
 
     RETURNS:
         trainors	list(type=str) list of list of files remaining in
@@ -84,7 +250,7 @@ def moveValidationSubsets(classDirs, headDir='./data', trainDir='train',
     {trainDir}/{classDir} and puts them into the corresponding
     {headDir}/{validationDir}/{classDir}. If testFrac is not None, will put
     testFrac of files from each {trainDir}/{classDir} into the corresponding
-    {headDir}/{testDir}/{classDir}.
+    {headDir}/{testDir}/{classDir}. Empty files are deleted.
     """
 
     if (testFrac is not None) and (testFrac > 0.0) and testDir is None:
@@ -94,78 +260,89 @@ def moveValidationSubsets(classDirs, headDir='./data', trainDir='train',
     head = Path(headDir)
     train = head / trainDir
     validate = head / validationDir
-    if not validate.is_dir():
-        validate.mkdir()
-    if testFrac is not None:
-        testing = head / testDir
-        if not testing.is_dir():
-            testing.mkdir()
+    testing = head / testDir if testFrac is not None else None
+
+    if journalPath is not None and Path(journalPath).exists():
+        print(f"Resuming the split journaled in {journalPath}.")
+        sources, dests, _ = readRelocationJournal(journalPath)
+    else:
+        sources, dests = _planValidationSubsets(classDirs, train, validate,
+                                                testing, validateFrac,
+                                                testFrac, fileSuffix,
+                                                nWorkers, volubility)
+
+    status, errors = relocateFiles(sources, dests, how='rename',
+                                   nWorkers=nWorkers, dryRun=testOnly,
+                                   journalPath=journalPath,
+                                   volubility=volubility)
 
     trainors = OrderedDict()
     validators = OrderedDict()
+    testors = OrderedDict()
+    for source, dest, result in zip(sources, dests, status):
+        if result not in ['done', 'kept']:
+            continue
+        source = Path(source)
+        if not dest:
+            splitors = trainors
+        elif Path(dest).parent.parent == validate:
+            splitors = validators
+        else:
+            splitors = testors
+        classDir = source.parent.name
+        if splitors.get(classDir, None) is None:
+            splitors[classDir] = [source.name]
+        else:
+            splitors[classDir].append(source.name)
+
     if testFrac is not None:
-        testors = OrderedDict()
+        return trainors, validators, testors
+    else:
+        return trainors, validators
 
-    # If validationDir / classDir not empty, put the files back into
-    # trainDir / classDir, so that the random selections & moves are done from
-    # scratch.
 
-    mvCts = {}
-    for classDir in classDirs:
-        trainSubdir = train / classDir
-        validateSubdir = validate / classDir
-        filePaths = list(validateSubdir.glob('*.' + fileSuffix))
-        totCt = len(filePaths)
-        if totCt > 0:
-            print(f"Moving {totCt} files from {validateSubdir}"
-                  f" to {trainSubdir}.")
-            for path in filePaths:
-                file = path.name
-                if mvCts.get(classDir, None) is None:
-                    mvCts[classDir] = 1
-                else:
-                    mvCts[classDir] += 1
-                destPath = trainSubdir / file
-                path.rename(destPath)
-
-    print(mvCts.keys())
-    for className in mvCts.keys():
-        trainSubdir = train / classDir
-        validateSubdir = validate / classDir
-        print(f"Moved {mvCts[className]} files from {validateSubdir} to "
-              f"{trainSubdir}.")
+def _planValidationSubsets(classDirs, train, validate, testing, validateFrac,
+                           testFrac, fileSuffix, nWorkers, volubility):
+    """
+    Puts any files already in validate / classDir or testing / classDir back
+    into train / classDir, so that the random selections are done from
+    scratch, and returns the (sources, dests) relocations making up a new
+    split for moveValidationSubsets(). dests are None for files staying in
+    train.
+    """
 
-    if testFrac is not None:
-        mvCts = {}
-        for classDir in classDirs:
-            trainSubdir = train / classDir
-            testSubdir = testing / classDir
-            filePaths = list(testSubdir.glob('*.' + fileSuffix))
-            totCt = len(filePaths)
-            if totCt > 0:
-                print(f"Moving {totCt} files from {testSubdir}"
-                      f" to {trainSubdir}.")
-                for path in filePaths:
-                    # print(f"path: {path}")
-                    file = path.name
-                    if mvCts.get(classDir, None) is None:
-                        mvCts[classDir] = 1
-                    else:
-                        mvCts[classDir] += 1
-                    destPath = trainSubdir / file
-                    path.rename(destPath)
-
-        print(mvCts.keys())
-        for className in mvCts.keys():
-            trainSubdir = train / classDir
-            testSubdir = testing / classDir
-            print(f"Moved {mvCts[className]} files from {testSubdir} to "
-                  f"{trainSubdir}.")
+    if not validate.is_dir():
+        validate.mkdir()
+    if testing is not None and not testing.is_dir():
+        testing.mkdir()
 
+    backSources = []
+    backDests = []
+    for fromDir in [validate] if testing is None else [validate, testing]:
+        for classDir in classDirs:
+            fromSubdir = fromDir / classDir
+            filePaths = list(fromSubdir.glob('*.' + fileSuffix))
+            if len(filePaths) > 0:
+                print(f"Moving {len(filePaths)} files from {fromSubdir}"
+                      f" to {train / classDir}.")
+                backSources.extend(filePaths)
+                backDests.extend(train / classDir / path.name
+                                 for path in filePaths)
+    if len(backSources) > 0:
+        _, errors = relocateFiles(backSources, backDests, how='rename',
+                                  nWorkers=nWorkers, removeEmpty=False,
+                                  volubility=volubility)
+        if len(errors) > 0:
+            raise Exception(f"Unable to move {len(errors)} files back into "
+                            f"{train}, e.g. {errors[0]}.")
+
+    sources = []
+    dests = []
     for classDir in classDirs:
         trainSubdir = train / classDir
-        totCt = len(list(trainSubdir.glob('*.' + fileSuffix)))
-        if totCt <= 0:
+        trainList = list(trainSubdir.glob('*.' + fileSuffix))
+        trainCt = len(trainList)
+        if trainCt <= 0:
             raise Exception(f"No files in {trainSubdir}; perhaps you haven't"
                             " yet moved your files there?")
 
@@ -182,7 +359,7 @@ def moveValidationSubsets(classDirs, headDir='./data', trainDir='train',
                             f" {validationSubdir}. You should figure out why"
                             " before attempting to re-run this.")
 
-        if testFrac is not None:
+        if testing is not None:
             testSubdir = testing / classDir
             if not testSubdir.is_dir():
                 print(f"Path {testSubdir} does not exist -- creating ...")
@@ -196,85 +373,346 @@ def moveValidationSubsets(classDirs, headDir='./data', trainDir='train',
                                 f"{testSubdir}. You should figure out why"
                                 " before attempting to re-run this.")
 
-        trainPaths = trainSubdir.glob('*.' + fileSuffix)
-        trainList = list(trainPaths)
-        trainCt = len(trainList)
         shuffle(trainList)
 
         validateLimit = round(trainCt*validateFrac)
         validateList = trainList[:validateLimit]
-        print(f"validateList = trainList[:{validateLimit}]")
-        print("validateList:\n", sorted([Path(t).name for t in validateList]))
-
-        for filePath in validateList:
-            path = Path(filePath)
-            file = path.name
-            if path.stat().st_size == 0:
-                path.remove_p()
-            else:
-                if validators.get(classDir, None) is None:
-                    validators[classDir] = [file]
-                else:
-                    validators[classDir].append(file)
-                if testOnly is False:
-                    destPath = validationSubdir / file
-                    path.rename(destPath)
-
-        if testFrac is None:
-            trainLimit = round(trainCt*validateFrac)
-            newTrainList = trainList[trainLimit:]
-            print(f"newTrainList = trainList[{trainLimit}:]")
-            print("newTrainList:\n",
-                  sorted([Path(t).name for t in newTrainList]))
+        if testing is None:
+            testLimit = validateLimit
         else:
             testLimit = round(trainCt*(validateFrac + testFrac))
-            testList = trainList[validateLimit: testLimit]
-            print(f"testList = trainList[{validateLimit}: {testLimit}]")
-            print("testList:\n", sorted([Path(t).name for t in testList]))
-            newTrainList = trainList[testLimit:]
+        testList = trainList[validateLimit: testLimit]
+        newTrainList = trainList[testLimit:]
+        if volubility > 1:
+            print(f"validateList = trainList[:{validateLimit}]")
+            print("validateList:\n",
+                  sorted([Path(t).name for t in validateList]))
+            if testing is not None:
+                print(f"testList = trainList[{validateLimit}: {testLimit}]")
+                print("testList:\n", sorted([Path(t).name for t in testList]))
             print(f"newTrainList = trainList[{testLimit}:]")
             print("newTrainList:\n",
                   sorted([Path(t).name for t in newTrainList]))
+        elif volubility > 0:
+            print(f"{classDir}: {len(validateList)} validate, "
+                  f"{len(testList)} test, {len(newTrainList)} train.")
 
-            for filePath in testList:
-                path = Path(filePath)
-                file = path.name
-                if path.stat().st_size == 0:
-                    path.remove_p()
-                else:
-                    if testors.get(classDir, None) is None:
-                        testors[classDir] = [file]
-                    else:
-                        testors[classDir].append(file)
-                    if testOnly is False:
-                        destPath = testSubdir / file
-                        path.rename(destPath)
-
-        for filePath in newTrainList:
-            path = Path(filePath)
-            file = path.name
-            if path.stat().st_size == 0:
-                path.remove_p()
-            else:
-                if trainors.get(classDir, None) is None:
-                    trainors[classDir] = [file]
-                else:
-                    trainors[classDir].append(file)
+        sources.extend(validateList)
+        dests.extend(validationSubdir / path.name for path in validateList)
+        if testing is not None:
+            sources.extend(testList)
+            dests.extend(testSubdir / path.name for path in testList)
+        sources.extend(newTrainList)
+        dests.extend([None]*len(newTrainList))
 
-    if testFrac is not None:
-        return trainors, validators, testors
+    return sources, dests
+
+
+def scanSplitDirs(headDir, splitDirs, classDirs, fileSuffix='jpg',
+                  nWorkers=8):
+    """
+    INPUT:
+        headDir		str, path to directory containing all split
+                        directories
+        splitDirs	dict, split name (e.g. 'train') --> directory name,
+                        relative to headDir
+        classDirs	list(type=str), class sub-directories of each split
+                        directory
+        fileSuffix	str, indicating type of image file, default: 'jpg'
+        nWorkers	int, number of threads listing directories,
+                        default: 8
+
+    RETURNS:
+        files		pd.DataFrame, with columns 'class', 'file' and
+                        'location' (the split whose directory holds the
+                        file), sorted by class and file
+
+    Lists every {headDir}/{splitDirs[split]}/{classDir} with os.scandir(),
+    one directory per thread, so no file is stat'ed or globbed twice.
+    """
+
+    head = Path(headDir)
+    suffix = '.' + fileSuffix
+    tasks = [(split, classDir)
+             for split in splitDirs for classDir in classDirs]
+
+    def listDir(task):
+        split, classDir = task
+        subdir = head / splitDirs[split] / classDir
+        if not subdir.is_dir():
+            return []
+        with os.scandir(subdir) as entries:
+            return [entry.name for entry in entries
+                    if entry.name.endswith(suffix) and entry.is_file()]
+
+    with ThreadPoolExecutor(max_workers=nWorkers) as pool:
+        listings = list(pool.map(listDir, tasks))
+
+    files = pd.DataFrame({
+        'class': np.repeat([c for s, c in tasks],
+                           [len(names) for names in listings]),
+        'file': [name for names in listings for name in names],
+        'location': np.repeat([s for s, c in tasks],
+                              [len(names) for names in listings])})
+    files = files.sort_values(['class', 'file'], kind='stable')\
+                 .reset_index(drop=True)
+
+    dups = files.duplicated(['class', 'file'])
+    if dups.any():
+        raise ValueError(f"{np.count_nonzero(dups)} files are in more than"
+                         " one split directory, e.g. "
+                         f"{files[dups].iloc[0].tolist()}. You should figure"
+                         " out why before splitting.")
+
+    return files
+
+
+def assignSplits(files, validateFrac=0.20, testFrac=None, seed=21):
+    """
+    INPUT:
+        files		pd.DataFrame, with columns 'class' and 'file', e.g. from
+                        scanSplitDirs()
+        validateFrac	float, fraction of each class assigned to
+                        'validation', default: 0.20
+        testFrac	float, fraction of each class assigned to 'test',
+                        default: None
+        seed		int, default: 21
+
+    RETURNS:
+        splits		np.ndarray(type=object), of 'train', 'validation' and
+                        'test', aligned with the rows of files
+
+    Deterministic, seeded split: every file gets a 64-bit hash of its class
+    and name (keyed on seed), and within each class, files with the lowest
+    hashes are assigned to validation, the next to test, and the rest to
+    train. The assignment depends only on the file names, not on listing
+    order, and adding or removing a few files changes only a few
+    assignments.
+    """
+
+    hashKey = f"{seed:016d}"[-16:]
+    hashes = pd.util.hash_array((files['class'].astype(str) + '/'
+                                 + files['file']).to_numpy(dtype=object),
+                                hash_key=hashKey)
+    classCodes, classes = pd.factorize(files['class'])
+    order = np.lexsort((hashes, classCodes))
+
+    classCts = np.bincount(classCodes, minlength=len(classes))
+    classStarts = np.concatenate(([0], np.cumsum(classCts)[:-1]))
+    ranks = np.empty(len(files), dtype='int64')
+    ranks[order] = np.arange(len(files)) - classStarts[classCodes[order]]
+
+    validateCts = np.round(classCts*validateFrac).astype('int64')
+    if testFrac is None:
+        testCts = validateCts
     else:
-        return trainors, validators
+        testCts = np.round(classCts*(validateFrac + testFrac)).astype('int64')
+
+    splits = np.full(len(files), 'train', dtype=object)
+    splits[ranks < testCts[classCodes]] = 'test'
+    splits[ranks < validateCts[classCodes]] = 'validation'
+    return splits
+
+
+def saveManifest(manifest, manifestPath):
+    """
+    INPUT:
+        manifest	pd.DataFrame, e.g. from splitManifest()
+        manifestPath	str or Path, ending in '.csv', '.parquet' or '.npz'
+    """
+
+    manifestPath = Path(manifestPath)
+    if manifestPath.suffix == '.parquet':
+        manifest.to_parquet(manifestPath, index=False)
+    elif manifestPath.suffix == '.npz':
+        np.savez(manifestPath, columns=np.array(manifest.columns, dtype=str),
+                 values=manifest.to_numpy(dtype=str))
+    else:
+        manifest.to_csv(manifestPath, index=False)
+
+
+def loadManifest(manifestPath):
+    """
+    INPUT:
+        manifestPath	str or Path, written by saveManifest()
+
+    RETURNS:
+        manifest	pd.DataFrame
+    """
+
+    manifestPath = Path(manifestPath)
+    if manifestPath.suffix == '.parquet':
+        return pd.read_parquet(manifestPath)
+    elif manifestPath.suffix == '.npz':
+        with np.load(manifestPath) as saved:
+            return pd.DataFrame(saved['values'].astype(object),
+                                columns=list(saved['columns']))
+    return pd.read_csv(manifestPath, dtype=str, keep_default_na=False)
+
+
+@timeUsage
+def splitManifest(classDirs, headDir='./data', trainDir='train',
+                  validationDir='validation', testDir=None,
+                  validateFrac=0.20, testFrac=None, fileSuffix='jpg',
+                  manifestPath=None, mode='manifest', linkDir=None, seed=21,
+                  nWorkers=8, volubility=1):
+    """
+    INPUT:
+        classDirs	list(type=str), class sub-directories
+        headDir		str, path to directory containing all training and
+                        test data, default: './data'
+        trainDir	str, default: 'train'
+        validationDir	str, default: 'validation'
+        testDir		str, default: None
+        validateFrac	float, default: 0.20
+        testFrac	float, default: None. If not None, testDir must also
+                        be set to a str != None.
+        fileSuffix	str, indicating type of image file, default: 'jpg'
+        manifestPath	str or Path, where the manifest is saved (as .csv,
+                        .parquet or .npz); if it already exists, it is read
+                        first as the previous manifest, default: None
+        mode		str, one of:
+                          'manifest', only compute and save the manifest;
+                          'move', move files whose directory differs from
+                            their assigned split's directory;
+                          'hardlink', leave files in place, and keep
+                            {linkDir}/{split}/{class}/{file} hard links,
+                            only relinking files whose assignment changed
+                            since the links were last made (as recorded
+                            in {linkDir}/links.csv);
+                        default: 'manifest'
+        linkDir		str, root of the hard-link tree, for mode='hardlink'
+        seed		int, seed for assignSplits(), default: 21
+        nWorkers	int, threads for directory listing, default: 8
+        volubility	int, default: 1
+
+    RETURNS:
+        manifest	pd.DataFrame, with columns 'class', 'file', 'split'
+                        (the assigned split) and 'path' (where the file is,
+                        relative to headDir, once any moves are done)
+
+    Alternative to moveValidationSubsets() that avoids moving every file
+    back into train and then out again. Files in all split directories are
+    listed in parallel, and assignSplits() gives each a deterministic split.
+    """
+
+    if (testFrac is not None) and (testFrac > 0.0) and testDir is None:
+        raise ValueError(f"You have testFrac: {testFrac}.\nWhen not None, "
+                         "you must specify a non-None testDir value.")
+    if mode not in ['manifest', 'move', 'hardlink']:
+        raise ValueError(f"You supplied mode: {mode}, but it must be one of"
+                         " ['manifest', 'move', 'hardlink'].")
+    if mode == 'hardlink' and linkDir is None:
+        raise ValueError("mode='hardlink' requires linkDir.")
+
+    splitDirs = {'train': trainDir, 'validation': validationDir}
+    if testDir is not None:
+        splitDirs['test'] = testDir
+
+    files = scanSplitDirs(headDir, splitDirs, classDirs, fileSuffix,
+                          nWorkers)
+    if files.shape[0] == 0:
+        raise Exception(f"No files in {headDir}; perhaps you haven't yet"
+                        " moved your files there?")
+    files['split'] = assignSplits(files, validateFrac, testFrac, seed)
+
+    previous = None
+    if manifestPath is not None and Path(manifestPath).exists():
+        previous = loadManifest(manifestPath)
+
+    head = Path(headDir)
+    if mode == 'move':
+        toMove = files[files['location'] != files['split']]
+        _, errors = relocateFiles(
+            [head / splitDirs[location] / className / file
+             for className, file, location in
+             toMove[['class', 'file', 'location']].itertuples(index=False)],
+            [head / splitDirs[split] / className / file
+             for className, file, split in
+             toMove[['class', 'file', 'split']].itertuples(index=False)],
+            how='rename', nWorkers=nWorkers, removeEmpty=False,
+            volubility=volubility - 1)
+        if len(errors) > 0:
+            raise Exception(f"Unable to move {len(errors)} files, e.g. "
+                            f"{errors[0]}. Re-run to retry them.")
+        files['location'] = files['split']
+        if volubility > 0:
+            print(f"Moved {toMove.shape[0]} of {files.shape[0]} files.")
+    elif mode == 'hardlink':
+        # The link tree keeps its own manifest, recording the links that
+        # exist, so that only changed assignments need relinking.
+        link = Path(linkDir)
+        linkManifestPath = link / 'links.csv'
+        if linkManifestPath.exists():
+            linked = loadManifest(linkManifestPath)
+        else:
+            linked = pd.DataFrame(columns=['class', 'file', 'split'])
+        merged = files.merge(linked[['class', 'file', 'split']],
+                             on=['class', 'file'], how='outer',
+                             suffixes=('', 'Prev'), indicator=True)
+        stale = merged[(merged['_merge'] == 'right_only')
+                       | ((merged['_merge'] == 'both')
+                          & (merged['split'] != merged['splitPrev']))]
+        for className, file, splitPrev in \
+                stale[['class', 'file', 'splitPrev']].itertuples(index=False):
+            (link / splitPrev / className / file).unlink(missing_ok=True)
+        fresh = merged[(merged['_merge'] == 'left_only')
+                       | ((merged['_merge'] == 'both')
+                          & (merged['split'] != merged['splitPrev']))]
+        for className, file, location, split in \
+                fresh[['class', 'file', 'location', 'split']].itertuples(
+                    index=False):
+            destSubdir = link / split / className
+            destSubdir.mkdir(parents=True, exist_ok=True)
+            (destSubdir / file).unlink(missing_ok=True)
+            os.link(head / splitDirs[location] / className / file,
+                    destSubdir / file)
+        link.mkdir(parents=True, exist_ok=True)
+        saveManifest(files[['class', 'file', 'split']], linkManifestPath)
+        if volubility > 0:
+            print(f"Relinked {fresh.shape[0]} of {files.shape[0]} files.")
+
+    manifest = files[['class', 'file', 'split']].copy()
+    manifest['path'] = [f"{splitDirs[location]}/{className}/{file}"
+                        for className, file, location in
+                        files[['class', 'file', 'location']].itertuples(
+                            index=False)]
+
+    if volubility > 0:
+        if previous is not None:
+            changed = manifest.merge(previous[['class', 'file', 'split']],
+                                     on=['class', 'file'], how='left',
+                                     suffixes=('', 'Prev'))
+            changedCt = np.count_nonzero(changed['split']
+                                         != changed['splitPrev'])
+            print(f"{changedCt} assignments changed since the previous "
+                  "manifest.")
+        print(manifest.groupby(['class', 'split']).size()
+                      .unstack(fill_value=0))
+    if manifestPath is not None:
+        saveManifest(manifest, manifestPath)
+
+    return manifest
 
 
 @timeUsage
 def splitDataFrameByClasses(df, classColumn, testFrac=0.33, volubility=1,
-                            randomizeResult=True, myRandomState=None):
+                            randomizeResult=True, myRandomState=None,
+                            returnIndices=False):
     """
     Conducts train/test splits of df separately for each class, and then
     concatenates them together.
 
-    Returns dfTrain, dfTest.
+    Returns dfTrain, dfTest. If returnIndices is True, instead returns
+    trainIdx, testIdx, int64 arrays of row positions in df, with the same
+    split and order, for slicing df (with take()) or aligned arrays, sparse
+    matrices or memmaps, without copying df.
+
+    Rows are located per class with a single stable argsort of the class
+    codes, each class is split as sklearn's train_test_split() would
+    (ceil(testFrac*n) test rows, from one permutation per class), and the
+    result is materialized with a single take(), so that a given seed gives
+    the same dfTrain, dfTest as splitting each class's rows in turn.
     """
 
     print("Consider whether sklearn's built-in method would work instead:\n\n"
@@ -300,49 +738,104 @@ def splitDataFrameByClasses(df, classColumn, testFrac=0.33, volubility=1,
     elif isinstance(myRandomState, int):
         myRandomState = np.random.RandomState(myRandomState)
 
-    for i, label in enumerate(labels):
-        dfLabel = df[df[classColumn] == label]
-        if volubility > 1:
-            print(f"dfLabel.shape: {dfLabel.shape}")
+    trainIdx, testIdx, _ = _classSplitPositions(df[classColumn], labels,
+                                                testFrac, myRandomState,
+                                                volubility)
 
-        dfLabelTrain, dfLabelTest = \
-            train_test_split(dfLabel, test_size=testFrac,
-                             random_state=myRandomState)
-        if volubility > 1:
-            print(f"dfLabelTr.shape: {dfLabelTr.shape}"
-                  f"\tdfLabelTe.shape: {dfLabelTe.shape}")
+    if randomizeResult:
+        trainIdx = trainIdx[myRandomState.permutation(len(trainIdx))]
+        testIdx = testIdx[myRandomState.permutation(len(testIdx))]
+    if returnIndices:
+        if volubility > 0:
+            print(f"len(trainIdx): {len(trainIdx)}"
+                  f"\tlen(testIdx): {len(testIdx)}")
+        return trainIdx, testIdx
 
-        if i == 0:
-            dfTest = dfLabelTest
-            dfTrain = dfLabelTrain
-        else:
-            dfTest = pd.concat([dfTest, dfLabelTest])
-            dfTrain = pd.concat([dfTrain, dfLabelTrain])
+    return _takeSplits(df, trainIdx, testIdx, randomizeResult, volubility)
+
+
+def _takeSplits(df, trainIdx, testIdx, resetIndex, volubility=1):
+    """
+    Materializes dfTrain, dfTest from row positions, with a single take()
+    each.
+    """
+
+    dfTrain = df.take(trainIdx)
+    dfTest = df.take(testIdx)
+    if resetIndex:
+        dfTrain = dfTrain.reset_index(drop=True)
+        dfTest = dfTest.reset_index(drop=True)
 
     if volubility > 0:
         print(f"dfTrain.shape: {dfTrain.shape}\tdfTest.shape: {dfTest.shape}")
 
-    if randomizeResult:
-        dfTrain = dfTrain.sample(frac=1, random_state=myRandomState)\
-                         .reset_index(drop=True)
-        dfTest = dfTest.sample(frac=1, random_state=myRandomState)\
-                       .reset_index(drop=True)
     return dfTrain, dfTest
 
 
+def _classSplitPositions(classes, labels, testFrac, randomState,
+                         volubility=1):
+    """
+    INPUT:
+        classes		pd.Series, class of each row
+        labels		list, the classes to split, in the order their
+                        permutations are drawn from randomState
+        testFrac	float, fraction of each class put into test
+        randomState	np.random.RandomState
+        volubility	int, default: 1
+
+    RETURNS:
+        trainIdx	np.ndarray(type=int64), row positions of the train rows,
+                        class by class, in labels order
+        testIdx		np.ndarray(type=int64), likewise for the test rows
+        trainCts	np.ndarray(type=int64), number of train rows of each
+                        class, in labels order
+    """
+
+    codes = pd.Index(labels).get_indexer(classes)
+    order = np.argsort(codes, kind='stable')
+    classCts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    classStarts = np.searchsorted(codes[order], np.arange(len(labels)))
+
+    trainParts = []
+    testParts = []
+    for label, start, classCt in zip(labels, classStarts, classCts):
+        testCt = int(np.ceil(testFrac*classCt))
+        if testCt == 0 or testCt == classCt:
+            raise ValueError(f"With {classCt} rows of class {label} and "
+                             f"testFrac: {testFrac}, either the train or the"
+                             " test set would be empty.")
+        positions = order[start + randomState.permutation(classCt)]
+        testParts.append(positions[:testCt])
+        trainParts.append(positions[testCt:])
+        if volubility > 1:
+            print(f"{label}: {classCt - testCt} train\t{testCt} test")
+
+    trainCts = np.array([len(part) for part in trainParts], dtype='int64')
+    return np.concatenate(trainParts), np.concatenate(testParts), trainCts
+
+
 @timeUsage
 def splitBalanceDataFrameByClasses(df, classColumn, targetClassSize,
                                    testFrac=0.33, randomizeResult=True,
-                                   myRandomState=None, volubility=1):
+                                   myRandomState=None, volubility=1,
+                                   returnIndices=False):
     """
     Conducts train/test splits of df separately for each class, then balances
     the classes of the training splits, and concatentates together. Balancing
     is done by sampling with replacement when the training set for a class
-    is < targetClassSize, and sampling without replacement when it
-    is > targetClassSize.
+    is < its target size, and sampling without replacement when it
+    is > its target size.
+
+    targetClassSize is an int (the same target for every class), a dict of
+    class --> target (classes not in it are left as they are), or a
+    function of the number of train rows of a class, returning its target,
+    e.g. lambda n: min(n, 1000).
 
     Returns dfTr, dfTe, where the testFrac ratio corresponds to the splits
-    prior to balancing dfTr classes.
+    prior to balancing dfTr classes. If returnIndices is True, instead
+    returns trainIdx, testIdx, int64 arrays of row positions in df (trainIdx
+    repeating the rows sampled more than once), as for
+    splitDataFrameByClasses().
     """
 
     if volubility > 0:
@@ -359,63 +852,749 @@ def splitBalanceDataFrameByClasses(df, classColumn, targetClassSize,
     elif isinstance(myRandomState, int):
         myRandomState = np.random.RandomState(myRandomState)
 
-    for i, label in enumerate(labels):
-        dfLabel = df[df[classColumn] == label]
-        if volubility > 1:
-            print(f"dfLabel.shape: {dfLabel.shape}")
+    trainIdx, testIdx, trainCts = \
+        _classSplitPositions(df[classColumn], labels, testFrac, myRandomState,
+                             volubility)
 
-        dfLabelTr, dfLabelTe = \
-            train_test_split(dfLabel, test_size=testFrac,
-                             random_state=myRandomState)
-        if volubility > 1:
-            print(f"dfLabelTr.shape: {dfLabelTr.shape}\tdfLabelTe.shape: "
-                  f"{dfLabelTe.shape}")
-
-        ct = dfLabelTe.shape[0]
-        if i == 0:
-            dfTest = dfLabelTe
-            if ct < targetClassSize:
-                dfTrain = dfLabelTr.sample(n=targetClassSize, replace=True,
-                                           random_state=myRandomState)
-            elif ct > targetClassSize:
-                dfTrain = dfLabelTr.sample(n=targetClassSize, replace=False,
-                                           random_state=myRandomState)
+    if isinstance(targetClassSize, dict):
+        targetSizes = [targetClassSize.get(label, trainCt)
+                       for label, trainCt in zip(labels, trainCts)]
+    elif callable(targetClassSize):
+        targetSizes = [targetClassSize(trainCt) for trainCt in trainCts]
+    else:
+        targetSizes = np.full(len(labels), targetClassSize)
+    if volubility > 1:
+        print(f"targetSizes: {dict(zip(labels, targetSizes))}")
+
+    trainIdx = balanceClassPositions(trainIdx,
+                                     np.repeat(np.arange(len(labels)),
+                                               trainCts),
+                                     targetSizes, myRandomState)
+
+    if randomizeResult:
+        trainIdx = trainIdx[myRandomState.permutation(len(trainIdx))]
+        testIdx = testIdx[myRandomState.permutation(len(testIdx))]
+    if returnIndices:
+        if volubility > 0:
+            print(f"len(trainIdx): {len(trainIdx)}"
+                  f"\tlen(testIdx): {len(testIdx)}")
+        return trainIdx, testIdx
+
+    return _takeSplits(df, trainIdx, testIdx, randomizeResult, volubility)
+
+
+def balanceClassPositions(positions, classCodes, targetSizes, randomState):
+    """
+    INPUT:
+        positions	np.ndarray(type=int64), row positions, e.g. of a train
+                        split
+        classCodes	np.ndarray(type=int), class code (0, 1, ...) of each
+                        position
+        targetSizes	array-like(type=int), target number of positions for
+                        each class code
+        randomState	np.random.RandomState
+
+    RETURNS:
+        balanced	np.ndarray(type=int64), targetSizes[c] positions of
+                        each class c, class by class. Classes with more
+                        positions than their target are sampled without
+                        replacement, those with fewer with replacement.
+
+    All classes are resampled at once: one random sort key per position
+    gives every class a random permutation, whose first targetSizes[c]
+    entries are kept, and classes that need more draw uniform offsets into
+    their own range of that ordering.
+    """
+
+    classCodes = np.asarray(classCodes)
+    targetSizes = np.asarray(targetSizes, dtype='int64')
+    classCts = np.bincount(classCodes, minlength=len(targetSizes))
+    empty = np.flatnonzero((classCts == 0) & (targetSizes > 0))
+    if len(empty) > 0:
+        raise ValueError(f"Cannot sample classes {empty}, which have no "
+                         "positions.")
+    classStarts = np.concatenate(([0], np.cumsum(classCts)[:-1]))
+
+    order = np.lexsort((randomState.random_sample(len(positions)),
+                        classCodes))
+    orderedCodes = classCodes[order]
+    ranks = np.arange(len(positions)) - classStarts[orderedCodes]
+    under = classCts < targetSizes
+    keep = (ranks < targetSizes[orderedCodes]) & ~under[orderedCodes]
+
+    underCodes = np.flatnonzero(under)
+    drawCodes = np.repeat(underCodes, targetSizes[underCodes])
+    draws = classStarts[drawCodes] \
+        + (randomState.random_sample(len(drawCodes))
+           * classCts[drawCodes]).astype('int64')
+
+    balancedCodes = np.concatenate((orderedCodes[keep], drawCodes))
+    balanced = positions[np.concatenate((order[keep], order[draws]))]
+    return balanced[np.argsort(balancedCodes, kind='stable')]
+
+
+class BalancedBatchSampler:
+    """
+    INPUT:
+        positions	array-like(type=int), row positions to sample from, e.g.
+                        trainIdx from splitDataFrameByClasses(...,
+                        returnIndices=True)
+        classes		array-like, class of each of positions
+        batchSz		int, default: 32
+        targetClassSize	int, rows of each class per epoch, setting the
+                        number of batches per epoch to
+                        ceil(nClasses*targetClassSize/batchSz). Default:
+                        None, the size of the largest class, as if every
+                        class were over-sampled to it.
+        X		array-like, sparse matrix or pd.DataFrame, if not None,
+                        batches are (X[batch], y[batch]) rather than row
+                        positions, default: None
+        y		array-like, default: None
+        seed		int, default: 21
+        prefetch	int, number of batches iteration prepares ahead on a
+                        background thread, default: 0 (no thread)
+
+    Streaming alternative to splitBalanceDataFrameByClasses(): each batch
+    draws every slot's class uniformly, then a row of that class uniformly
+    from its pool of positions, so batches are class-balanced on average
+    without duplicating any rows.
+
+    Batch i of epoch e depends only on (seed, e, i), so batches are
+    reproducible in any order. sampler[i] and len(sampler), and
+    on_epoch_end() to advance the epoch, match keras.utils.Sequence, so it
+    can be passed to model.fit() as is. Iterating over it yields one epoch
+    of batches, then advances the epoch.
+    """
+
+    def __init__(self, positions, classes, batchSz=32, targetClassSize=None,
+                 X=None, y=None, seed=21, prefetch=0):
+        positions = np.asarray(positions, dtype='int64')
+        classCodes, self.labels = pd.factorize(np.asarray(classes))
+        if len(classCodes) != len(positions):
+            raise ValueError(f"Got {len(classCodes)} classes for "
+                             f"{len(positions)} positions.")
+        order = np.argsort(classCodes, kind='stable')
+        self.pools = positions[order]
+        self.classCts = np.bincount(classCodes, minlength=len(self.labels))
+        self.classStarts = np.concatenate(([0],
+                                           np.cumsum(self.classCts)[:-1]))
+
+        if targetClassSize is None:
+            targetClassSize = self.classCts.max()
+        self.batchSz = batchSz
+        self.nBatches = int(np.ceil(len(self.labels)*targetClassSize
+                                    / batchSz))
+        self.X = X
+        self.y = y
+        self.seed = seed
+        self.prefetch = prefetch
+        self.epoch = 0
+
+    def __len__(self):
+        return self.nBatches
+
+    def batchPositions(self, i):
+        """
+        Returns the row positions making up batch i of the current epoch.
+        """
+
+        if not 0 <= i < self.nBatches:
+            raise IndexError(f"Batch {i} is out of range for "
+                             f"{self.nBatches} batches.")
+        randState = np.random.RandomState([self.seed, self.epoch, i])
+        slotCodes = randState.randint(0, len(self.labels), size=self.batchSz)
+        offsets = (randState.random_sample(self.batchSz)
+                   * self.classCts[slotCodes]).astype('int64')
+        return self.pools[self.classStarts[slotCodes] + offsets]
+
+    def __getitem__(self, i):
+        batch = self.batchPositions(i)
+        if self.X is None:
+            return batch
+        if isinstance(self.X, pd.DataFrame):
+            xBatch = self.X.take(batch)
+        else:
+            xBatch = self.X[batch]
+        if self.y is None:
+            return xBatch
+        if isinstance(self.y, pd.Series):
+            return xBatch, self.y.take(batch)
+        return xBatch, np.asarray(self.y)[batch]
+
+    def on_epoch_end(self):
+        self.epoch += 1
+
+    def __iter__(self):
+        try:
+            if self.prefetch <= 0:
+                for i in range(self.nBatches):
+                    yield self[i]
             else:
-                dfTrain = dfLabelTr
+                yield from self._prefetched()
+        finally:
+            # Even when the loop over the batches is broken off.
+            self.on_epoch_end()
+
+    def _prefetched(self):
+        # Batches are made on a thread, up to prefetch ahead; an exception
+        # there is passed through the queue and raised here.
+        batches = Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for i in range(self.nBatches):
+                    if stop.is_set():
+                        return
+                    batches.put((self[i], None))
+            except BaseException as err:
+                batches.put((None, err))
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            for i in range(self.nBatches):
+                while True:
+                    try:
+                        batch, err = batches.get(timeout=0.1)
+                        break
+                    except Empty:
+                        if not producer.is_alive() and batches.empty():
+                            raise RuntimeError("The prefetching thread "
+                                               "stopped before batch "
+                                               f"{i}.")
+                if err is not None:
+                    raise err
+                yield batch
+        finally:
+            stop.set()
+            # Unblocks the producer, if it is waiting on a full queue.
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except Empty:
+                    pass
+
+
+def _iterChunks(inPaths, chunkSz, columns=None):
+    """
+    Yields DataFrames of at most chunkSz rows (of only columns, if not None)
+    from each of inPaths in turn; '.parquet' files are read a batch of row
+    groups at a time with pyarrow, anything else as CSV.
+    """
+
+    for inPath in inPaths:
+        if Path(inPath).suffix == '.parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(inPath).iter_batches(chunkSz,
+                                                             columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(inPath, chunksize=chunkSz, usecols=columns)
+
+
+def _canonicalStrings(values):
+    """
+    Returns an object array of a str for each of values (or, for a
+    DataFrame, for each row), which is the same however the values were
+    parsed: integral floats are written as ints, so that 1 read into a float
+    column (as pandas does when the chunk has a NaN) matches 1 read into an
+    int column, or as a str.
+    """
+
+    if isinstance(values, pd.DataFrame):
+        strings = np.full(len(values), '', dtype=object)
+        for j in range(values.shape[1]):
+            strings = strings + _canonicalStrings(values.iloc[:, j]) + '\x1f'
+        return strings
+
+    values = pd.Series(values)
+    strings = values.astype(str).to_numpy(dtype=object)
+    if pd.api.types.is_float_dtype(values):
+        v = values.to_numpy(dtype='float64')
+        integral = np.isfinite(v) & (v == np.floor(v)) & (np.abs(v) < 2.0**63)
+        strings[integral] = v[integral].astype('int64').astype(str)
+    return strings
+
+
+def _keyHashes(values, seed):
+    """
+    Maps values (an array, or a DataFrame, hashed row by row) to uint64s via
+    a seeded 64-bit hash of their _canonicalStrings().
+    """
+
+    hashKey = f"{seed:016d}"[-16:]
+    return pd.util.hash_array(_canonicalStrings(values), hash_key=hashKey)
+
+
+def _uniformHashes(values, seed):
+    """
+    Maps values, as for _keyHashes(), to floats in [0, 1).
+    """
+
+    return (_keyHashes(values, seed) >> np.uint64(11)).astype('float64') \
+        * 2.0**-53
+
+
+def _isBelowFrac(hashes, frac):
+    """
+    Returns a bool array, True where the uint64 hashes are below frac*2**64,
+    i.e. for about a fraction frac of uniform hashes.
+    """
+
+    cutoff = int(frac*2**64)
+    if cutoff >= 2**64:
+        return np.ones(len(hashes), dtype=bool)
+    return hashes < np.uint64(max(cutoff, 0))
+
+
+def _hashThresholds(inPaths, classColumn, keyColumn, testFrac, chunkSz,
+                    seed):
+    """
+    First pass of splitStreamByClasses(method='exact'): returns a dict of
+    canonical class str --> hash threshold, below which a row of the class
+    is test, so that round(testFrac*n) of the class's n rows are.
+    """
+
+    columns = None if keyColumn is None else \
+        list(dict.fromkeys([keyColumn, classColumn]))
+    classCodes = {}
+    codes = []
+    hashes = []
+    for chunk in _iterChunks(inPaths, chunkSz, columns):
+        keys = chunk if keyColumn is None else chunk[keyColumn]
+        hashes.append(_uniformHashes(keys, seed))
+        classes, inverse = np.unique(_canonicalStrings(chunk[classColumn]),
+                                     return_inverse=True)
+        chunkCodes = np.array([classCodes.setdefault(c, len(classCodes))
+                               for c in classes], dtype='int64')
+        codes.append(chunkCodes[inverse])
+    codes = np.concatenate(codes) if codes else np.zeros(0, dtype='int64')
+    hashes = np.concatenate(hashes) if hashes else np.zeros(0)
+
+    order = np.lexsort((hashes, codes))
+    classCts = np.bincount(codes, minlength=len(classCodes))
+    starts = np.concatenate(([0], np.cumsum(classCts)[:-1]))
+    testCts = np.floor(testFrac*classCts + 0.5).astype('int64')
+    thresholds = np.full(len(classCodes), np.inf)
+    below = testCts < classCts
+    thresholds[below] = hashes[order[starts[below] + testCts[below]]]
+    return dict(zip(classCodes, thresholds))
+
+
+@timeUsage
+def splitStreamByClasses(inPaths, classColumn, outDir, keyColumn=None,
+                         testFrac=0.33, method='hash', chunkSz=1000000,
+                         outFormat='csv', seed=21, tolerance=0.01,
+                         volubility=1):
+    """
+    INPUT:
+        inPaths		str or Path, or list of them, CSV or '.parquet' files
+                        (the latter need pyarrow)
+        classColumn	str
+        outDir		str or Path, under which train/ and test/ shards are
+                        written, one of each per chunk read (skipping any
+                        that would be empty)
+        keyColumn	str, column uniquely identifying each row, hashed to
+                        assign it. If None, the whole row is hashed.
+                        Default: None
+        testFrac	float, default: 0.33
+        method		str, one of:
+                          'hash', a row is test if the 64-bit hash of its
+                            key is below testFrac*2**64, so each row is
+                            decided on its own, in one pass, and each
+                            class's test fraction is testFrac only up to
+                            sampling error (about sqrt(testFrac*(1 -
+                            testFrac)/n) for n rows; see tolerance). Memory
+                            is bounded by chunkSz;
+                          'exact', stratified by hash rank: a first pass
+                            hashes every row's key, and finds, for each
+                            class, the hash below which round(testFrac*n) of
+                            its n rows fall; the second pass writes the rows
+                            below it to test. This holds a hash and class
+                            code, and their sort order, for every row, i.e.
+                            about 24 bytes per input row;
+                          'counter', per-class counters put the k-th row of
+                            each class into test whenever that keeps the
+                            class's test count within 1 of testFrac*k, from
+                            a hashed per-class phase, so ratios are exact
+                            in one pass (but depend on row order). Memory
+                            is bounded by chunkSz, plus a count per class;
+                        For 'hash' and 'exact', keys are hashed in a
+                        canonical str form, so assignments depend on
+                        neither chunking nor file order, nor on how pandas
+                        parsed the key's column. Default: 'hash'
+        chunkSz		int, rows read at a time, default: 1000000
+        outFormat	str, 'csv' or 'parquet', default: 'csv'
+        seed		int, default: 21
+        tolerance	float, classes whose test fraction differs from testFrac
+                        by more than this are reported (printed, for
+                        volubility > 0); nothing is enforced, default: 0.01
+        volubility	int, default: 1
+
+    RETURNS:
+        counts		pd.DataFrame, indexed by class, with columns 'train',
+                        'test' and 'testFrac'
+
+    Out-of-core alternative to splitDataFrameByClasses(): for 'hash' and
+    'counter', memory use is bounded by chunkSz, whatever the size of the
+    inputs.
+    """
+
+    if method not in ['hash', 'exact', 'counter']:
+        raise ValueError(f"You supplied method: {method}, but it must be one"
+                         " of ['hash', 'exact', 'counter'].")
+    if isinstance(inPaths, (str, Path)):
+        inPaths = [inPaths]
+
+    out = Path(outDir)
+    for split in ['train', 'test']:
+        (out / split).mkdir(parents=True, exist_ok=True)
+
+    if method == 'exact':
+        thresholds = _hashThresholds(inPaths, classColumn, keyColumn,
+                                     testFrac, chunkSz, seed)
+
+    seen = pd.Series(dtype='int64')
+    testCts = pd.Series(dtype='int64')
+    for i, chunk in enumerate(_iterChunks(inPaths, chunkSz)):
+        classes = chunk[classColumn]
+        keys = chunk if keyColumn is None else chunk[keyColumn]
+        if method == 'hash':
+            isTest = _isBelowFrac(_keyHashes(keys, seed), testFrac)
+        elif method == 'exact':
+            classStrs, inverse = np.unique(_canonicalStrings(classes),
+                                           return_inverse=True)
+            isTest = _uniformHashes(keys, seed) < np.array(
+                [thresholds[c] for c in classStrs])[inverse]
         else:
-            dfTest = pd.concat([dfTest, dfLabelTe])
-            if ct < targetClassSize:
-                dfTrain = \
-                    pd.concat([dfTrain,
-                               dfLabelTr.sample(n=targetClassSize,
-                                                replace=True,
-                                                random_state=myRandomState)])
-            elif ct > targetClassSize:
-                dfTrain = \
-                    pd.concat([dfTrain,
-                               dfLabelTr.sample(n=targetClassSize,
-                                                replace=False,
-                                                random_state=myRandomState)])
+            # k: 0-based count of the rows of the same class seen before.
+            k = classes.map(seen).fillna(0).to_numpy(dtype='int64') \
+                + classes.groupby(classes, sort=False, dropna=False)\
+                         .cumcount().to_numpy()
+            phase = _uniformHashes(classes, seed)
+            isTest = np.floor(testFrac*(k + 1) + phase) \
+                > np.floor(testFrac*k + phase)
+
+        seen = seen.add(classes.value_counts(dropna=False), fill_value=0)\
+                   .astype('int64')
+        testCts = testCts.add(classes[isTest].value_counts(dropna=False),
+                              fill_value=0).astype('int64')
+        for split, rows in [('train', ~isTest), ('test', isTest)]:
+            if not rows.any():
+                continue
+            shardPath = out / split / f"part-{i:05d}.{outFormat}"
+            if outFormat == 'parquet':
+                chunk[rows].to_parquet(shardPath, index=False)
             else:
-                dfTrain = pd.concat([dfTrain, dfLabelTr])
+                chunk[rows].to_csv(shardPath, index=False)
+        if volubility > 1:
+            print(f"chunk {i}: {np.count_nonzero(~isTest)} train, "
+                  f"{np.count_nonzero(isTest)} test")
 
-    if volubility > 1:
-        print(f"type(dfTrain): {type(dfTrain)}"
-              f"\ttype(dfTest): {type(dfTest)}")
+    testCts = testCts.reindex(seen.index, fill_value=0)
+    counts = pd.DataFrame({'train': seen - testCts, 'test': testCts,
+                           'testFrac': testCts/seen})
     if volubility > 0:
-        print(f"dfTrain.shape: {dfTrain.shape}"
-              f"\tdfTest.shape: {dfTest.shape}")
+        print(f"Wrote {counts['train'].sum()} train and {counts['test'].sum()}"
+              f" test rows of {len(counts)} classes to {out}.")
+        outside = counts[(counts['testFrac'] - testFrac).abs() > tolerance]
+        if len(outside) > 0:
+            print(f"{len(outside)} classes have test fractions outside "
+                  f"{testFrac} ± {tolerance}:\n{outside}")
 
-    if randomizeResult:
-        dfTrain = dfTrain.sample(frac=1, random_state=myRandomState)\
-                         .reset_index(drop=True)
-        dfTest = dfTest.sample(frac=1, random_state=myRandomState)\
-                       .reset_index(drop=True)
-    return dfTrain, dfTest
+    return counts
+
+
+class GloVeStore:
+    """
+    INPUT:
+        vectors		np.ndarray or np.memmap, shape (vocab, dim), float32,
+                        one embedding vector per row
+        words		list(type=str), words labelling the rows of vectors
+
+    Read-only, dict-like container for word embeddings. All vectors live in
+    one contiguous (vocab, dim) float32 matrix, and words are mapped to row
+    numbers, so the per-array overhead of a dict of 400k small arrays is
+    avoided. Supports store[word], word in store, store.get(word), len(),
+    iteration over words, keys(), values() and items(), so code written for
+    the dict returned by earlier versions of GloVeDict() keeps working.
+
+    When opened with GloVeStore.load(), the matrix is memory-mapped from a
+    .npy file, so that loading is nearly instantaneous and any number of
+    processes reading the same file share a single page-cached copy.
+    """
+
+    def __init__(self, vectors, words):
+        if len(words) != vectors.shape[0]:
+            raise ValueError(f"Got {len(words)} words, but vectors has "
+                             f"{vectors.shape[0]} rows.")
+        self.vectors = vectors
+        self.words = list(words)
+        self.rows = dict(zip(self.words, range(len(self.words))))
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def __getitem__(self, word):
+        return self.vectors[self.rows[word]]
+
+    def __contains__(self, word):
+        return word in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def get(self, word, default=None):
+        row = self.rows.get(word)
+        if row is None:
+            return default
+        return self.vectors[row]
+
+    def keys(self):
+        return self.rows.keys()
+
+    def values(self):
+        return (self.vectors[row] for row in self.rows.values())
+
+    def items(self):
+        return ((word, self.vectors[row]) for word, row in self.rows.items())
+
+    def _tokenRows(self, docs, lower):
+        """
+        Returns the row number of every token in docs (flattened), with -1
+        for tokens not in the store, and the token count of each doc.
+        """
+
+        lengths = np.fromiter((len(doc) for doc in docs), dtype='int64',
+                              count=len(docs))
+        rows = self.rows
+        if lower:
+            tokenRows = [rows.get(token.lower(), -1)
+                         for doc in docs for token in doc]
+        else:
+            tokenRows = [rows.get(token, -1) for doc in docs for token in doc]
+        return np.array(tokenRows, dtype='int64'), lengths
+
+    def lookupDocs(self, docs, maxLen=None, ragged=False, lower=True):
+        """
+        INPUT:
+            docs	list(type=list(type=str)), tokenized documents, e.g.
+                        [tokenizer.tokenize(text) for text in texts]
+            maxLen	int, padded length; longer docs are truncated,
+                        default: None (length of the longest doc)
+            ragged	bool, if True, return concatenated token vectors with
+                        offsets instead of a padded array, default: False
+            lower	bool, lower-case tokens before lookup, default: True
+
+        RETURNS (ragged == False):
+            X		np.ndarray, shape (docs, maxLen, dim), float32, with
+                        zero vectors for padding and out-of-vocabulary tokens
+            oov		np.ndarray, shape (docs, maxLen), bool, True where
+                        the token is not in the store
+            lengths	np.ndarray, shape (docs,), int64, number of tokens in
+                        each doc, before truncation
+
+        RETURNS (ragged == True):
+            offsets	np.ndarray, shape (docs + 1,), int64; the vectors of
+                        doc i are values[offsets[i]:offsets[i + 1]]
+            values	np.ndarray, shape (tokens, dim), float32, with zero
+                        vectors for out-of-vocabulary tokens
+            oov		np.ndarray, shape (tokens,), bool
+
+        Looks up all tokens in one pass, then gathers their vectors from the
+        embedding matrix with a single fancy-indexing operation.
+        """
+
+        tokenRows, lengths = self._tokenRows(docs, lower)
+        offsets = np.zeros(len(docs) + 1, dtype='int64')
+        np.cumsum(lengths, out=offsets[1:])
+        oovTokens = tokenRows < 0
+
+        if ragged:
+            values = self.vectors[np.where(oovTokens, 0, tokenRows)]
+            values[oovTokens] = 0.0
+            return offsets, values, oovTokens
+
+        if maxLen is None:
+            maxLen = int(lengths.max()) if len(docs) > 0 else 0
+        docIds = np.repeat(np.arange(len(docs)), lengths)
+        positions = np.arange(tokenRows.shape[0]) - offsets[docIds]
+        keep = positions < maxLen
+        docIds, positions = docIds[keep], positions[keep]
+        tokenRows, oovTokens = tokenRows[keep], oovTokens[keep]
+
+        X = np.zeros((len(docs), maxLen, self.dim), dtype='float32')
+        X[docIds[~oovTokens], positions[~oovTokens]] = \
+            self.vectors[tokenRows[~oovTokens]]
+        oov = np.zeros((len(docs), maxLen), dtype=bool)
+        oov[docIds, positions] = oovTokens
+
+        return X, oov, lengths
+
+    def poolDocs(self, docs, how='mean', lower=True):
+        """
+        INPUT:
+            docs	list(type=list(type=str)), tokenized documents
+            how		str, one of ['mean', 'sum'], default: 'mean'
+            lower	bool, lower-case tokens before lookup, default: True
+
+        RETURNS:
+            pooled	np.ndarray, shape (docs, dim), float32, the sum or mean
+                        of the vectors of each doc's in-vocabulary tokens
+                        (zeros for docs with none)
+
+        Pooling is done as one sparse (docs, vocab) count matrix product with
+        the embedding matrix, so no per-token vectors are materialized.
+        """
+
+        if how not in ['mean', 'sum']:
+            raise ValueError(f"You supplied how: {how}, but it must be one "
+                             "of ['mean', 'sum'].")
+
+        tokenRows, lengths = self._tokenRows(docs, lower)
+        docIds = np.repeat(np.arange(len(docs)), lengths)
+        inVocab = tokenRows >= 0
+        counts = sp.csr_matrix((np.ones(np.count_nonzero(inVocab),
+                                        dtype='float32'),
+                                (docIds[inVocab], tokenRows[inVocab])),
+                               shape=(len(docs), self.vectors.shape[0]))
+        pooled = np.asarray(counts @ self.vectors, dtype='float32')
+        if how == 'mean':
+            nTokens = np.bincount(docIds[inVocab], minlength=len(docs))
+            pooled /= np.maximum(nTokens, 1)[:, np.newaxis]
+
+        return pooled
+
+    def save(self, storePath):
+        """
+        INPUT:
+            storePath	str or Path, path of the .npy file to write. The
+                        vocabulary is written alongside, with suffix
+                        .vocab.txt, one word per line in row order.
+        """
+
+        storePath = Path(storePath)
+        np.save(storePath, np.ascontiguousarray(self.vectors,
+                                                dtype='float32'))
+        with open(storePath.with_suffix('.vocab.txt'), 'w',
+                  encoding='utf-8', newline='\n') as vocabFile:
+            vocabFile.writelines(word + '\n' for word in self.words)
+
+    @classmethod
+    def load(cls, storePath, mmap=True):
+        """
+        INPUT:
+            storePath	str or Path, path of a .npy file written by save()
+            mmap	bool, if True, memory-map the matrix read-only instead
+                        of reading it into memory, default: True
+
+        RETURNS:
+            store	GloVeStore
+        """
+
+        storePath = Path(storePath)
+        vectors = np.load(storePath, mmap_mode='r' if mmap else None)
+        with open(storePath.with_suffix('.vocab.txt'), encoding='utf-8',
+                  newline='\n') as vocabFile:
+            words = vocabFile.read().split('\n')[:-1]
+        return cls(vectors, words)
+
+    @classmethod
+    def fromDict(cls, embeddings):
+        """
+        INPUT:
+            embeddings	dict, 1-d embedding vectors indexed by word, such as
+                        the pickled dicts written by earlier versions of
+                        GloVeDict()
+
+        RETURNS:
+            store	GloVeStore, holding the same vectors in one matrix
+        """
+
+        words = list(embeddings.keys())
+        vectors = np.empty((len(words), len(embeddings[words[0]])),
+                           dtype='float32')
+        for i, word in enumerate(words):
+            vectors[i] = embeddings[word]
+        return cls(vectors, words)
+
+
+def readGloVeText(RawGloVeFile, normed=True, chunkLines=50000,
+                  volubility=1):
+    """
+    INPUT:
+        RawGloVeFile	str or Path, GloVe text file, with one word per line,
+                        followed by its space-separated coefficients
+        normed		bool, indicating whether or not to normalize the
+                        embedding vectors, default: True
+        chunkLines	int, number of lines parsed per chunk, default: 50000
+        volubility	int, if > 0, print progress after each chunk,
+                        default: 1
+
+    RETURNS:
+        vectors		np.ndarray, shape (vocab, dim), float32
+        words		list(type=str), words labelling the rows of vectors
+
+    Bulk parser for GloVe text files. Lines are counted first so that the
+    matrix can be preallocated; then the file is read chunkLines at a time by
+    pandas' C parser, with each chunk's coefficients copied into the matrix
+    as one block. Normalization is one batched norm over all rows.
+    """
+
+    RawGloVeFile = Path(RawGloVeFile)
+
+    # Count lines (allowing for a missing final newline) and get the
+    # dimension from the first line, so that the matrix can be preallocated.
+    lineCt = 0
+    lastByte = b'\n'
+    with open(RawGloVeFile, 'rb') as rawFile:
+        for buf in iter(lambda: rawFile.read(1 << 24), b''):
+            lineCt += buf.count(b'\n')
+            lastByte = buf[-1:]
+    if lastByte != b'\n':
+        lineCt += 1
+    with open(RawGloVeFile, encoding='utf-8') as GloVeVects:
+        dim = len(GloVeVects.readline().rstrip('\n').split(' ')) - 1
+
+    # Words are kept as str (na_filter=False stops 'nan', 'null', etc. from
+    # becoming NaN), and quoting is off, since '"' is itself a GloVe word.
+    dtypes = {0: object}
+    dtypes.update({i: np.float32 for i in range(1, dim + 1)})
+    chunks = pd.read_csv(RawGloVeFile, sep=' ', header=None, engine='c',
+                         quoting=csv.QUOTE_NONE, na_filter=False,
+                         dtype=dtypes, encoding='utf-8',
+                         chunksize=chunkLines)
+
+    vectors = np.empty((lineCt, dim), dtype='float32')
+    words = []
+    row = 0
+    for chunk in chunks:
+        if chunk.shape[1] != dim + 1:
+            raise ValueError(f"Expected {dim} coefficients per line in lines"
+                             f" {row + 1}-{row + chunk.shape[0]} of "
+                             f"{RawGloVeFile}, but found "
+                             f"{chunk.shape[1] - 1}.")
+        vectors[row:row + chunk.shape[0]] = \
+            chunk.iloc[:, 1:].to_numpy(dtype='float32')
+        words.extend(chunk[0].tolist())
+        row += chunk.shape[0]
+        if volubility > 0:
+            print(f"Parsed {row}/{lineCt} lines ({100*row/lineCt:5.1f}%).")
+
+    vectors = vectors[:row]
+    if normed:
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return vectors, words
 
 
 @timeUsage
-def GloVeDict(GloVeDir, embeddingSz=200, normed=True):
+def GloVeDict(GloVeDir, embeddingSz=200, normed=True, memmap=True):
     """
     INPUT:
         GloVeDir	str, path to GloVe embedding data
@@ -423,13 +1602,17 @@ def GloVeDict(GloVeDir, embeddingSz=200, normed=True):
                         the embedding vectors you want returned.
         normed		bool, indicating whether or not to normalize the
                         embedding vectors, default: True
-
-    Returns a dict containing GloVe word embedding vectors of specified
-    dimensions, indexed by un-cased words, as computed by Stanford from the
-    Wikipedia 2014 data set. If a corresponding pickle file is found, it will
-    simply load and return the dict. Otherwise, it will extract the embeddings
-    from the source file, create the dict and save the pickled dict, before
-    returning the dict.
+        memmap		bool, if True, return a GloVeStore memory-mapped from
+                        a .npy cache file; if False, return a dict, cached as
+                        a pickle file (the original behavior), default: True
+
+    Returns a dict-like GloVeStore (or, for memmap=False, a dict) containing
+    GloVe word embedding vectors of specified dimensions, indexed by un-cased
+    words, as computed by Stanford from the Wikipedia 2014 data set. If a
+    corresponding cache file is found, it will simply load and return it. If
+    only the pickled dict exists, it is converted to a .npy cache. Otherwise,
+    it will extract the embeddings from the source file and save the cache,
+    before returning the embeddings.
     """
 
     if embeddingSz not in [50, 100, 200, 300]:
@@ -440,10 +1623,20 @@ def GloVeDict(GloVeDir, embeddingSz=200, normed=True):
         GloVeFile = Path(GloVeDir) / f"GloVe.6B.{embeddingSz:03d}normed.pkl"
     else:
         GloVeFile = Path(GloVeDir) / f"GloVe.6B.{embeddingSz:03d}.pkl"
+    storeFile = GloVeFile.with_suffix('.npy')
+
+    if memmap and storeFile.exists():
+        print(f"Memory-mapping GloVe vectors from {storeFile} ...")
+        return GloVeStore.load(storeFile)
     if GloVeFile.exists():
         print(f"Loading GloVe vectors from {GloVeFile} ...")
         with open(GloVeFile, 'rb') as pickledGloVe:
-            return pickle.load(pickledGloVe)
+            GloVeDict = pickle.load(pickledGloVe)
+        if not memmap:
+            return GloVeDict
+        print(f"Saving embeddings store to {storeFile}.")
+        GloVeStore.fromDict(GloVeDict).save(storeFile)
+        return GloVeStore.load(storeFile)
     else:
         RawGloVeFile = Path(GloVeDir) / f"glove.6B.{embeddingSz:03d}d.txt"
         print(f"{GloVeFile} does not (yet) exist.")
@@ -451,20 +1644,16 @@ def GloVeDict(GloVeDir, embeddingSz=200, normed=True):
         if RawGloVeFile.exists():
             print("Reading GloVe vectors from raw text file, "
                   f"{RawGloVeFile} ...")
-            GloVeDict = {}
-            GloVeVects = RawGloVeFile.open(encoding='utf-8')
-            for l in GloVeVects:
-                parts = l.split()
-                word = parts[0]
-                coeffs = np.asarray(parts[1:], dtype='float32')
-                if normed:
-                    GloVeDict[word] = coeffs/np.linalg.norm(coeffs)
-                else:
-                    GloVeDict[word] = coeffs
-            GloVeVects.close()
-
-            print(f"vocab size: {len(GloVeDict.keys())}.")
+            vectors, words = readGloVeText(RawGloVeFile, normed=normed)
+
+            print(f"vocab size: {len(words)}.")
 
+            if memmap:
+                print(f"Saving embeddings store to {storeFile}.")
+                GloVeStore(vectors, words).save(storeFile)
+                return GloVeStore.load(storeFile)
+
+            GloVeDict = dict(zip(words, vectors))
             print(f"Saving embeddings dict to {GloVeFile}.")
             pFile = open(GloVeFile, 'wb')
             pickle.dump(GloVeDict, pFile, -1)
@@ -477,20 +1666,121 @@ def GloVeDict(GloVeDir, embeddingSz=200, normed=True):
             return 1
 
 
-def sparseUniq(spMatrix, axis=0):
+def _mix64(x):
+    """
+    splitmix64 finalizer, scrambling an np.uint64 array element-wise.
+    """
+
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _csrRowHashes(spMatrix, salt=0):
+    """
+    Returns a 64-bit hash of each row of the canonical CSR matrix spMatrix,
+    computed from its indices and data buffers: each stored entry is hashed
+    from its column and value, and each row's entry hashes are summed (a
+    cumulative sum, differenced at indptr), so rows with the same entries
+    hash alike. Different salts give independent hashes.
+    """
+
+    with np.errstate(over='ignore'):
+        values = spMatrix.data.astype('float64') + 0.0
+        entryHashes = _mix64(spMatrix.indices.astype('uint64')
+                             ^ _mix64(values.view('uint64')
+                                      + np.uint64(salt)))
+        sums = np.concatenate((np.zeros(1, dtype='uint64'),
+                               np.cumsum(entryHashes, dtype='uint64')))
+        nnzs = np.diff(spMatrix.indptr).astype('uint64')
+        return _mix64(sums[spMatrix.indptr[1:]] - sums[spMatrix.indptr[:-1]]
+                      + _mix64(nnzs))
+
+
+def _csrRowsEqual(spMatrix, rows, others):
+    """
+    Returns a bool array: whether each of rows of the canonical CSR matrix
+    spMatrix holds exactly the same entries as the matching row of others.
+    """
+
+    indptr = spMatrix.indptr
+    nnzs = indptr[rows + 1] - indptr[rows]
+    equal = nnzs == indptr[others + 1] - indptr[others]
+    rows, others, nnzs = rows[equal], others[equal], nnzs[equal]
+    ramp = np.arange(nnzs.sum()) - np.repeat(np.cumsum(nnzs) - nnzs, nnzs)
+    these = np.repeat(indptr[rows], nnzs) + ramp
+    those = np.repeat(indptr[others], nnzs) + ramp
+    mismatched = (spMatrix.indices[these] != spMatrix.indices[those]) \
+        | (spMatrix.data[these] != spMatrix.data[those])
+    equal[np.flatnonzero(equal)[np.unique(np.repeat(np.arange(len(rows)),
+                                                    nnzs)[mismatched])]] \
+        = False
+    return equal
+
+
+def _csrLexOrder(spMatrix, rows):
+    """
+    Returns rows of the canonical CSR matrix spMatrix, sorted
+    lexicographically on each row's values followed by its column indices,
+    shorter sequences first: the order np.unique() gives the LIL
+    data + rows lists. Ties are broken one sequence position at a time,
+    only among the rows still tied.
+    """
+
+    indptr = spMatrix.indptr
+    order = rows.copy()
+    groups = np.zeros(len(rows), dtype='int64')
+    active = np.arange(len(rows))
+    k = 0
+    while len(active) > 0:
+        activeRows = order[active]
+        nnzs = indptr[activeRows + 1] - indptr[activeRows]
+        starts = indptr[activeRows]
+        keys = np.full(len(active), -np.inf)
+        inData = k < nnzs
+        keys[inData] = spMatrix.data[starts[inData] + k]
+        inIndices = ~inData & (k < 2*nnzs)
+        keys[inIndices] = spMatrix.indices[starts[inIndices] + k
+                                           - nnzs[inIndices]]
+
+        # Groups are labelled by their first position, so sorting on
+        # (group, key) leaves each group where it was.
+        s = np.lexsort((keys, groups[active]))
+        order[active] = activeRows[s]
+        keys = keys[s]
+        activeGroups = groups[active][s]
+        newGroup = np.concatenate(([True],
+                                   (activeGroups[1:] != activeGroups[:-1])
+                                   | (keys[1:] != keys[:-1])))
+        groups[active] = active[np.maximum.accumulate(
+            np.where(newGroup, np.arange(len(active)), 0))]
+
+        groupCts = np.bincount(groups[active], minlength=len(rows))
+        active = active[(groupCts[groups[active]] > 1) & (keys > -np.inf)]
+        k += 1
+
+    return order
+
+
+def sparseUniq(spMatrix, axis=0, returnInverse=False, returnCounts=False):
     '''
     INPUT:
         spMatrix	spMatrix, a sparse matrix
         axis		int (0 or 1), indicating the dimension to be extracted,
                         with 0 for returning rows (and their indices), and 1
                         for returning columns, default: 0
+        returnInverse	bool, if True, also return inverse, default: False
+        returnCounts	bool, if True, also return counts, default: False
 
     RETURNS:
         spUniq		sparse matrix, containing only unique rows or columns
-        inds		list of corresponding indices
-
-    Refer to https://stackoverflow.com/questions/46126840/.
-    ./get-unique-rows-from-a-scipy-sparse-matrix#52891452
+        inds		np.ndarray, the index of the first occurrence of each
+                        unique row or column
+        inverse		np.ndarray, only if returnInverse, the index in spUniq
+                        of each row or column of spMatrix
+        counts		np.ndarray, only if returnCounts, the number of times
+                        each unique row or column occurs in spMatrix
 
     Extracts sparse matrix containing only unique rows (axis=0) or columns
     (axis=1) of spMatrix.
@@ -498,34 +1788,441 @@ def sparseUniq(spMatrix, axis=0):
 
     The returned indices can be helpful for slicing paired arrays, when
     you want to extract the corresponding rows/columns.
+
+    Works directly on the CSR indptr/indices/data buffers: rows are
+    grouped by a hash of their entries, every duplicate is confirmed
+    entry by entry against the first row with its hash (with an exact
+    fallback for true hash collisions), and the unique rows are sorted in
+    the order of the original LIL-based version (refer to
+    https://stackoverflow.com/questions/46126840/
+    ./get-unique-rows-from-a-scipy-sparse-matrix#52891452), so spUniq and
+    inds are unchanged.
     '''
 
     if axis == 1:
         spMatrix = spMatrix.T
 
     origFormat = spMatrix.getformat()
-    # print(f"origFormat: {origFormat}")
-    dt = np.dtype(spMatrix)
-    ncols = spMatrix.shape[1]
+    spMatrix = spMatrix.tocsr()
+    if not spMatrix.has_canonical_format:
+        spMatrix = spMatrix.copy()
+        spMatrix.sum_duplicates()
+    nRows = spMatrix.shape[0]
+
+    # The first row with each hash represents all rows with that hash.
+    hashes = _csrRowHashes(spMatrix)
+    order = np.argsort(hashes, kind='stable')
+    sortedHashes = hashes[order]
+    firsts = np.concatenate(([True],
+                             sortedHashes[1:] != sortedHashes[:-1]))[:nRows]
+    reps = np.empty(nRows, dtype='int64')
+    reps[order] = order[np.maximum.accumulate(
+        np.where(firsts, np.arange(nRows), 0))]
+
+    dups = np.flatnonzero(reps != np.arange(nRows))
+    collided = dups[~_csrRowsEqual(spMatrix, dups, reps[dups])]
+    for hashValue in np.unique(hashes[collided]):
+        seen = {}
+        for row in np.flatnonzero(hashes == hashValue):
+            lo, hi = spMatrix.indptr[row], spMatrix.indptr[row + 1]
+            key = (spMatrix.indices[lo:hi].tobytes(),
+                   spMatrix.data[lo:hi].tobytes())
+            reps[row] = seen.setdefault(key, row)
+
+    inds = _csrLexOrder(spMatrix, np.flatnonzero(reps == np.arange(nRows)))
+
+    spUniq = spMatrix[inds].asformat(origFormat)
+    if axis == 1:
+        spUniq = spUniq.T
+
+    retvals = [spUniq, inds]
+    if returnInverse or returnCounts:
+        uniqPositions = np.empty(nRows, dtype='int64')
+        uniqPositions[inds] = np.arange(len(inds))
+        inverse = uniqPositions[reps]
+        if returnInverse:
+            retvals.append(inverse)
+        if returnCounts:
+            retvals.append(np.bincount(inverse, minlength=len(inds)))
+    return tuple(retvals)
 
-    if origFormat != 'lil':
-        spMatrix = spMatrix.tolil()
 
-    _, inds = np.unique(spMatrix.data + spMatrix.rows, return_index=True)
-    rows = spMatrix.rows[inds]
-    data = spMatrix.data[inds]
-    nrows_uniq = data.shape[0]
+class SparseRowIndex:
+    """
+    Global index of unique sparse rows, for dedupSparseShards(). Each row
+    is keyed by a 128-bit fingerprint, two independently salted 64-bit
+    hashes of its entries (from _csrRowHashes()), and mapped to the global
+    id of its first occurrence, so rows of different chunks and shards can
+    be matched without keeping them in memory. nRows counts every row
+    indexed so far, and numbers the next row added.
+
+    Fingerprints are held in sorted runs of uint64 arrays, with the ids
+    alongside, i.e. 24 bytes per distinct row. A batch of rows is matched
+    against each run with np.searchsorted(), and its new rows make a new
+    run, merged with the last while that is at most twice as long, so that
+    there are O(log n) runs, and each row is copied O(log n) times in all.
+
+    save() and load() persist the index as .npz, so that later shards can
+    be deduplicated against those already seen.
+    """
 
-    # spMatrix.resize(nrows_uniq, ncols)
-    spMatrix = sp.lil_matrix((nrows_uniq, ncols), dtype=dt)
-    spMatrix.data = data
-    spMatrix.rows = rows
+    def __init__(self):
+        # (hashes, salted, ids) of each run, sorted by hash, then salted;
+        # longest first.
+        self.runs = []
+        self.nRows = 0
+
+    def __len__(self):
+        return sum(len(ids) for hashes, salted, ids in self.runs)
+
+    @staticmethod
+    def _positions(run, hashes, salted):
+        # Where each (hash, salted) pair is, or would be inserted, in run.
+        runHashes, runSalted, runIds = run
+        lo = np.searchsorted(runHashes, hashes)
+        positions = lo.copy()
+        after = lo < len(runIds)
+        after[after] = (runHashes[lo[after]] == hashes[after]) \
+            & (runSalted[lo[after]] < salted[after])
+        positions[after] += 1
+        # Distinct fingerprints sharing their first hash are rare: past the
+        # first of them, they're searched one at a time.
+        more = after & (positions < len(runIds))
+        more[more] = runHashes[positions[more]] == hashes[more]
+        for i in np.flatnonzero(more):
+            hi = np.searchsorted(runHashes, hashes[i], side='right')
+            positions[i] = lo[i] + np.searchsorted(runSalted[lo[i]:hi],
+                                                   salted[i])
+        return positions
+
+    def add(self, hashes, salted, rows):
+        """
+        INPUT:
+            hashes	np.ndarray(type=uint64), first hash of each row
+            salted	np.ndarray(type=uint64), second hash of each row
+            rows	np.ndarray(type=int64), global id of each row
+
+        RETURNS:
+            reps	np.ndarray(type=int64), global id of the first
+                        occurrence of each row: rows not seen before are
+                        added, and represent themselves
+        """
+
+        # Sorted, stably, so the first of equal fingerprints comes first.
+        order = np.lexsort((salted, hashes))
+        sortedHashes, sortedSalted = hashes[order], salted[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (sortedHashes[1:] != sortedHashes[:-1]) \
+            | (sortedSalted[1:] != sortedSalted[:-1])
+        uniqHashes, uniqSalted = sortedHashes[first], sortedSalted[first]
+        uniqReps = np.asarray(rows, dtype='int64')[order][first]
+
+        found = np.zeros(len(uniqReps), dtype=bool)
+        for run in self.runs:
+            look = np.flatnonzero(~found)
+            positions = self._positions(run, uniqHashes[look],
+                                        uniqSalted[look])
+            inRun = positions < len(run[2])
+            inRun[inRun] = \
+                (run[0][positions[inRun]] == uniqHashes[look[inRun]]) \
+                & (run[1][positions[inRun]] == uniqSalted[look[inRun]])
+            uniqReps[look[inRun]] = run[2][positions[inRun]]
+            found[look[inRun]] = True
+
+        new = ~found
+        run = (uniqHashes[new], uniqSalted[new], uniqReps[new])
+        while len(self.runs) > 0 and len(self.runs[-1][2]) <= 2*len(run[2]):
+            last = self.runs.pop()
+            positions = self._positions(last, run[0], run[1])
+            run = tuple(np.insert(lastArray, positions, runArray)
+                        for lastArray, runArray in zip(last, run))
+        if len(run[2]) > 0:
+            self.runs.append(run)
+
+        reps = np.empty(len(order), dtype='int64')
+        reps[order] = uniqReps[np.cumsum(first) - 1]
+        return reps
+
+    def save(self, indexPath):
+        hashes, salted, ids = [np.concatenate([run[i] for run in self.runs]
+                                              + [np.zeros(0, dtype=dtype)])
+                               for i, dtype in enumerate(['uint64', 'uint64',
+                                                          'int64'])]
+        np.savez(indexPath, hashes=hashes, salted=salted, rows=ids,
+                 nRows=self.nRows)
+
+    @classmethod
+    def load(cls, indexPath):
+        index = cls()
+        with np.load(indexPath) as saved:
+            index.add(saved['hashes'], saved['salted'], saved['rows'])
+            index.nRows = int(saved['nRows'])
+        return index
+
+
+def _hashSparseChunk(chunk):
+    """
+    Worker for dedupSparseShards(): deduplicates chunk with sparseUniq(),
+    and fingerprints its unique rows.
+    """
 
-    spUniq = spMatrix.asformat(origFormat)
-    if axis == 1:
-        spUniq = spUniq.T
+    spUniq, inds, inverse = sparseUniq(chunk, returnInverse=True)
+    spUniq = spUniq.tocsr()
+    return (inds, inverse, _csrRowHashes(spUniq),
+            _csrRowHashes(spUniq, salt=0x5851F42D4C957F2D))
+
+
+@timeUsage
+def dedupSparseShards(shards, chunkSz=100000, nWorkers=None, maxPending=None,
+                      indexPath=None, volubility=1):
+    """
+    INPUT:
+        shards		list of sparse matrices, or of paths to them saved with
+                        sp.save_npz(), all with the same number of columns.
+                        Paths are loaded one at a time.
+        chunkSz		int, rows deduplicated by a worker at a time,
+                        default: 100000
+        nWorkers	int, number of worker processes, default: None
+                        (os.cpu_count())
+        maxPending	int, max number of chunks in flight, which bounds
+                        memory use, default: None (2*nWorkers)
+        indexPath	str or Path, '.npz' SparseRowIndex. If it exists, rows
+                        are matched against those indexed before, and
+                        numbered after them. The updated index is saved
+                        there. Default: None
+        volubility	int, default: 1
+
+    RETURNS:
+        uniq		np.ndarray(type=int64), global ids of the rows of shards
+                        that are the first occurrence of their contents
+        reps		np.ndarray(type=int64), for every row of shards, in
+                        order, the global id of its first occurrence
+        index		SparseRowIndex
+
+    Rows are numbered globally, across shards in order, starting from
+    index.nRows (0, without a saved index). Each chunk is deduplicated
+    with sparseUniq() on a process pool; its unique rows are then looked up
+    in the global index, in this process, so duplicates are found across
+    chunks, shards and runs.
+    """
+
+    if nWorkers is None:
+        nWorkers = os.cpu_count()
+    if maxPending is None:
+        maxPending = 2*nWorkers
+
+    if indexPath is not None and Path(indexPath).exists():
+        index = SparseRowIndex.load(indexPath)
+    else:
+        index = SparseRowIndex()
+    firstRow = index.nRows
+
+    repParts = []
+    pending = deque()
+
+    def finishOldest():
+        start, nRows, future = pending.popleft()
+        inds, inverse, hashes, salted = future.result()
+        reps = index.add(hashes, salted, start + inds)
+        repParts.append(reps[inverse])
+
+    with ProcessPoolExecutor(max_workers=nWorkers) as pool:
+        for shard in shards:
+            if isinstance(shard, (str, Path)):
+                shard = sp.load_npz(shard)
+            shard = shard.tocsr()
+            for lo in range(0, shard.shape[0], chunkSz):
+                chunk = shard[lo:lo + chunkSz]
+                pending.append((index.nRows, chunk.shape[0],
+                                pool.submit(_hashSparseChunk, chunk)))
+                index.nRows += chunk.shape[0]
+                if len(pending) >= maxPending:
+                    finishOldest()
+        while pending:
+            finishOldest()
+
+    if len(repParts) > 0:
+        reps = np.concatenate(repParts)
+    else:
+        reps = np.zeros(0, dtype='int64')
+    uniq = np.flatnonzero(reps == firstRow + np.arange(len(reps))) + firstRow
+
+    if indexPath is not None:
+        index.save(indexPath)
+    if volubility > 0:
+        print(f"{len(uniq)} new unique rows of {len(reps)}; {len(index)} "
+              f"unique rows of {index.nRows} indexed.")
+
+    return uniq, reps, index
+
+
+def minHashSignatures(spMatrix, nPerm=128, seed=21, permChunk=16,
+                      maxBytes=2**28):
+    """
+    INPUT:
+        spMatrix	sparse matrix, each row treated as the set of its
+                        nonzero column indices
+        nPerm		int, number of hash functions, default: 128
+        seed		int, default: 21
+        permChunk	int, hash functions evaluated together, default: 16
+        maxBytes	int, rows are hashed in blocks of at most
+                        maxBytes/(8*permChunk) nonzeros (or one row, if it
+                        has more), so each uint64 array of hashes takes at
+                        most maxBytes; the hash arithmetic holds a few of
+                        them at once, default: 2**28
+
+    RETURNS:
+        signatures	np.ndarray(type=uint32), shape (nRows, nPerm), the
+                        minimum over each row's columns of each hash
+                        function; all 0xFFFFFFFF for empty rows
+
+    The fraction of equal signature entries of two rows estimates the
+    Jaccard similarity of their column sets. Column hashes are computed for
+    all nonzeros at once, and reduced per row with np.minimum.reduceat()
+    over the CSR indptr.
+    """
+
+    spMatrix = spMatrix.tocsr()
+    if not spMatrix.has_canonical_format:
+        spMatrix = spMatrix.copy()
+        spMatrix.sum_duplicates()
+    nnzs = np.diff(spMatrix.indptr)
+    nonEmpty = nnzs > 0
+    signatures = np.full((spMatrix.shape[0], nPerm), np.iinfo('uint32').max,
+                         dtype='uint32')
+    if not nonEmpty.any():
+        return signatures
+
+    salts = np.random.RandomState(seed).randint(0, 2**62, size=nPerm,
+                                                dtype='int64')
+    rows = np.flatnonzero(nonEmpty)
+    ends = np.cumsum(nnzs[rows])
+    blockNnz = max(maxBytes//(8*permChunk), 1)
+    first = 0
+    while first < len(rows):
+        before = ends[first - 1] if first > 0 else 0
+        last = max(int(np.searchsorted(ends, before + blockNnz,
+                                       side='right')), first + 1)
+        blockRows = rows[first:last]
+        lo = spMatrix.indptr[blockRows[0]]
+        hi = spMatrix.indptr[blockRows[-1] + 1]
+        columns = spMatrix.indices[lo:hi].astype('uint64')
+        starts = spMatrix.indptr[blockRows] - lo
+        with np.errstate(over='ignore'):
+            for p in range(0, nPerm, permChunk):
+                hashes = _mix64(columns[:, None]
+                                + salts[p:p + permChunk].astype('uint64'))
+                signatures[blockRows, p:p + permChunk] = np.minimum.reduceat(
+                    hashes >> np.uint64(32), starts, axis=0)
+        first = last
+    return signatures
+
+
+def _lshBands(nPerm, threshold):
+    """
+    Returns (nBands, bandSz), with nBands*bandSz == nPerm, whose LSH
+    threshold (1/nBands)**(1/bandSz) is closest to, without exceeding,
+    threshold, so that pairs at the threshold are likely candidates.
+    """
 
-    return spUniq, inds
+    choices = [(nPerm//bandSz, bandSz) for bandSz in range(1, nPerm + 1)
+               if nPerm % bandSz == 0]
+    below = [(b, r) for b, r in choices if (1/b)**(1/r) <= threshold]
+    if len(below) == 0:
+        return choices[0]
+    return max(below, key=lambda br: (1/br[0])**(1/br[1]))
+
+
+@timeUsage
+def nearDuplicateClusters(spMatrix, threshold=0.8, nPerm=128, nBands=None,
+                          seed=21, volubility=1):
+    """
+    INPUT:
+        spMatrix	sparse matrix, e.g. bag-of-words counts, each row
+                        treated as the set of its nonzero column indices
+        threshold	float, minimum Jaccard similarity of near-duplicate
+                        rows, default: 0.8
+        nPerm		int, MinHash signature length, default: 128
+        nBands		int, number of LSH bands, which must divide nPerm.
+                        Default: None, chosen from threshold by _lshBands()
+        seed		int, default: 21
+        volubility	int, default: 1
+
+    RETURNS:
+        labels		np.ndarray(type=int64), cluster of each row, numbered
+                        in order of each cluster's first row
+        clusters	list(type=np.ndarray), row indices of each cluster of
+                        two or more rows
+
+    Approximate counterpart to sparseUniq(): rows are MinHashed
+    (minHashSignatures()) and bucketed by LSH banding. Within each bucket,
+    every row is paired with the bucket's first row, the exact Jaccard
+    similarity of each pair is checked against threshold, and the clusters
+    are the connected components of the pairs passing. Every step is
+    linear in the number of rows and nonzeros, up to sorting. Empty rows
+    are never clustered.
+    """
+
+    spMatrix = spMatrix.tocsr()
+    nRows = spMatrix.shape[0]
+    if nBands is None:
+        nBands, bandSz = _lshBands(nPerm, threshold)
+    else:
+        bandSz = nPerm//nBands
+    if nBands*bandSz != nPerm:
+        raise ValueError(f"nBands: {nBands} must divide nPerm: {nPerm}.")
+
+    signatures = minHashSignatures(spMatrix, nPerm, seed)
+    rows = np.flatnonzero(np.diff(spMatrix.indptr) > 0)
+
+    firsts = []
+    others = []
+    with np.errstate(over='ignore'):
+        for band in range(nBands):
+            keys = np.zeros(len(rows), dtype='uint64')
+            for col in range(band*bandSz, (band + 1)*bandSz):
+                keys = _mix64(keys ^ signatures[rows, col].astype('uint64'))
+            order = np.argsort(keys, kind='stable')
+            sortedKeys = keys[order]
+            newKey = np.concatenate(([True],
+                                     sortedKeys[1:] != sortedKeys[:-1])
+                                    )[:len(rows)]
+            bucketFirsts = order[np.maximum.accumulate(
+                np.where(newKey, np.arange(len(rows)), 0))]
+            paired = ~newKey
+            firsts.append(rows[bucketFirsts[paired]])
+            others.append(rows[order[paired]])
+    pairs = np.unique(np.column_stack((np.concatenate(firsts),
+                                       np.concatenate(others))), axis=0)
+
+    binary = spMatrix.astype('float64')
+    binary.sum_duplicates()
+    binary.data[:] = 1.0
+    sizes = np.diff(binary.indptr)
+    intersections = np.asarray(binary[pairs[:, 0]].multiply(
+        binary[pairs[:, 1]]).sum(axis=1)).ravel()
+    jaccards = intersections/(sizes[pairs[:, 0]] + sizes[pairs[:, 1]]
+                              - intersections)
+    pairs = pairs[jaccards >= threshold]
+
+    graph = sp.csr_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+                          shape=(nRows, nRows))
+    _, components = connected_components(graph, directed=False)
+    # Renumbers clusters by their first row.
+    _, firstRows, labels = np.unique(components, return_index=True,
+                                     return_inverse=True)
+    labels = np.argsort(np.argsort(firstRows))[labels]
+
+    clusterCts = np.bincount(labels)
+    byCluster = np.argsort(labels, kind='stable')
+    clusters = [c for c in np.split(byCluster, np.cumsum(clusterCts)[:-1])
+                if len(c) > 1]
+    if volubility > 0:
+        print(f"{len(pairs)} near-duplicate pairs (of "
+              f"{len(np.concatenate(others))} LSH candidates) in "
+              f"{len(clusters)} clusters, of {nBands} bands x {bandSz}.")
+
+    return labels, clusters
 
 
 tokenizer = RegexpTokenizer(r'[\-\–\—]+|\w+')
@@ -569,118 +2266,320 @@ digit2text = {0:     'zero',
               }
 
 
-def nums2words(s, precision=2):
+_scaleWords = ['thousand', 'million', 'billion', 'trillion']
+
+# Spellings GloVe has, where digit2text's differ.
+_gloveSpellings = {'fourty': 'forty'}
+
+
+def _numberParts(n):
+    """
+    Returns the list of words read, in order, for the int n >= 0, e.g.
+    3235 --> ['thirty-two', 'thirty-five'], 305 --> ['three', 'oh', 'five'],
+    or 12340 --> ['twelve', 'thousand', 'three', 'hundred', 'fourty'], or
+    None, if n is too large to read. Below 10000, numbers are read
+    colloquially, in pairs of digits; from 10000 up, strictly, with each
+    'hundred' said.
+    """
+
+    if n < 100:
+        if n <= 20 or n % 10 == 0:
+            return [digit2text[n]]
+        return [digit2text[n - n % 10] + '-' + digit2text[n % 10]]
+    if n < 10000:
+        hundreds, rest = divmod(n, 100)
+        if n % 1000 == 0:
+            return _numberParts(n//1000) + ['thousand']
+        if rest == 0:
+            return _numberParts(hundreds) + ['hundred']
+        return (_numberParts(hundreds) + (['oh'] if rest < 10 else [])
+                + _numberParts(rest))
+    g = min((len(str(n)) - 1)//3, len(_scaleWords))
+    high, rest = divmod(n, 1000**g)
+    if high >= 10000:
+        return None
+    return (_groupParts(high) + [_scaleWords[g - 1]]
+            + (_groupParts(rest) if rest else []))
+
+
+def _groupParts(n):
+    """
+    Returns the list of words read strictly, with each 'hundred' said, for
+    the int n > 0, e.g. 340 --> ['three', 'hundred', 'fourty'], 5 -->
+    ['five'], or 2340 --> ['two', 'thousand', 'three', 'hundred', 'fourty'].
+    """
+
+    if n >= 1000:
+        g = (len(str(n)) - 1)//3
+        high, rest = divmod(n, 1000**g)
+        return (_groupParts(high) + [_scaleWords[g - 1]]
+                + (_groupParts(rest) if rest else []))
+    hundreds, rest = divmod(n, 100)
+    return (([digit2text[hundreds], 'hundred'] if hundreds else [])
+            + (_numberParts(rest) if rest else []))
+
+
+class NumberWords:
+    """
+    Lookup of the words nums2words() (or, if glove, nums2GloVeWords())
+    substitutes for digit tokens. The words for every integer up to bound
+    are computed once, so converting a token is one int() and an index into
+    a list; larger numbers are worked out as they are seen, and the words
+    for the maxLarge tokens used most recently are kept.
+
+    Numbers are truncated to precision significant digits, then read as
+    they are usually spoken, e.g., for '3235':
+        precision	words
+        1		'three-thousand'
+        2		'thirty-two-hundred'
+        3		'thirty-two-thirty'
+        4		'thirty-two-thirty-five'
+    From 10000 up, numbers are read in full, e.g. '12345', for precision 4,
+    as 'twelve-thousand-three-hundred-fourty'.
+
+    For glove, 'fourty' is spelled 'forty', as GloVe has it, and the words
+    read are separated by spaces, rather than hyphens, e.g. 'thirty-two
+    hundred', unless vocab (e.g. a GloVeStore) is given, in which case the
+    hyphenated form is kept where vocab has it, and any other compound
+    missing from vocab is split at its hyphens.
+    """
+
+    def __init__(self, precision=2, bound=9999, glove=False, vocab=None,
+                 maxLarge=10000):
+        """
+        INPUT:
+            precision	int, 1 to 4, significant digits of numbers to read,
+                            default: 2
+            bound		int, largest number to precompute words for,
+                            default: 9999
+            glove		bool, if True, words as for nums2GloVeWords(),
+                            default: False
+            vocab		container of str, e.g. a GloVeStore or set, of
+                            the words that may be used, for glove,
+                            default: None
+            maxLarge	int, most tokens above bound to keep the words
+                            of, least recently used dropped first,
+                            default: 10000
+        """
+
+        if precision not in range(1, 5):
+            raise ValueError("precision must be 1, 2, 3 or 4; you specified "
+                             f"{precision}.")
+        self.precision = precision
+        self.bound = bound
+        self.glove = glove
+        self.vocab = vocab
+        self.maxLarge = maxLarge
+        self.words = [self.verbalize(n) for n in range(bound + 1)]
+        self._large = OrderedDict()
+        self._largeLock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_largeLock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._largeLock = threading.Lock()
+
+    def verbalize(self, n):
+        """
+        Returns the words for the int n >= 0, or None, if it is too large to
+        read.
+        """
+
+        n -= n % 10**max(len(str(n)) - self.precision, 0)
+        parts = _numberParts(n)
+        if parts is None or not self.glove:
+            return parts if parts is None else '-'.join(parts)
+        parts = ['-'.join(_gloveSpellings.get(w, w) for w in p.split('-'))
+                 for p in parts]
+        if self.vocab is None:
+            return ' '.join(parts)
+        if '-'.join(parts) in self.vocab:
+            return '-'.join(parts)
+        return ' '.join(p if p in self.vocab else p.replace('-', ' ')
+                        for p in parts)
+
+    def __getitem__(self, token):
+        """
+        Returns the words for the str token, if it is a number, or else token
+        itself.
+        """
+
+        if not token.isdecimal():
+            return token
+        n = int(token)
+        if n <= self.bound:
+            return self.words[n]
+        with self._largeLock:
+            words = self._large.get(token)
+            if words is not None:
+                self._large.move_to_end(token)
+                return words
+        words = self.verbalize(n) or token
+        with self._largeLock:
+            self._large[token] = words
+            while len(self._large) > self.maxLarge:
+                self._large.popitem(last=False)
+        return words
+
+
+_sharedNumberWords = {}
+
+
+def _numberWordsTable(precision, glove):
+    """
+    Returns the NumberWords for precision and glove, built on first use and
+    shared by nums2words(), nums2GloVeWords() and nums2wordsBatch().
+    """
+
+    if (precision, glove) not in _sharedNumberWords:
+        _sharedNumberWords[precision, glove] = NumberWords(precision,
+                                                           glove=glove)
+    return _sharedNumberWords[precision, glove]
+
+
+_numTokenPattern = re.compile(r'[\-\–\—]+|\w+')
+_dashes = ['-', '–', '—']
+
+
+def _nums2wordsText(s, lookup):
+    """
+    Tokenizes the str s, replaces dashes between digit tokens by 'to', maps
+    every token through lookup, and returns the lowercased tokens joined by
+    spaces.
+    """
+
+    tokens = _numTokenPattern.findall(s)
+    if '-' in s or '–' in s or '—' in s:
+        for i in range(1, len(tokens) - 1):
+            if tokens[i] in _dashes and tokens[i - 1].isdigit() \
+                    and tokens[i + 1].isdigit():
+                tokens[i] = 'to'
+    return ' '.join(map(lookup, tokens)).lower()
+
+
+def nums2words(s, precision=2, numberWords=None):
     """
     INPUT:
         s				str, string to be converted, if digits
-        precision		int, number of digits of precision when summarizing s,
-                        default: 2, max=3
+        precision		int, number of significant digits kept when
+                        summarizing numbers in s, 1 to 4, default: 2
+        numberWords		NumberWords, to look numbers up in instead of the
+                        shared one for precision, default: None
 
     If s contains an integer string, this will return a string for a number
     approximately representing the integer. E.g.,
-    '3235' --> 'thirty-two hundred', for precision == 2, or
-    '3235' --> 'three-twenty-three ten', for precision == 3
+    '3235' --> 'thirty-two-hundred', for precision == 2, or
+    '3235' --> 'thirty-two-thirty', for precision == 3, or
+    '3235' --> 'thirty-two-thirty-five', for precision == 4
     """
 
     if s == '':
         return s
+    if numberWords is None:
+        numberWords = _numberWordsTable(precision, False)
+    return _nums2wordsText(s, numberWords.__getitem__)
 
-    if precision != 2:
-        raise NotImplemented("Only precision 2 implimented; you specified "
-                             f"{precision}.")
 
-    tokens = tokenizer.tokenize(s)
-    As = tokens[:-2]
-    Bs = tokens[1:-1]
-    Cs = tokens[2:]
-
-    for i, (a, b, c) in enumerate(zip(As, Bs, Cs)):
-        if a.isdigit() and c.isdigit() and (b in ['-', '–', '—']):
-            tokens[i + 1] = 'to'
-
-    tokens = list(map(lambda w: w.lower(), tokens))
-
-    for i, token in enumerate(tokens):
-        if token.isdigit():
-            intToken = int(token)
-            if intToken <= 20:
-                tokens[i] = digit2text[intToken]
-            elif len(token) == 2:
-                tens = int(token[0])
-                singles = int(token[1])
-                tokens[i] = digit2text[10*tens] + '-' + digit2text[singles]
-            elif len(token) == 3:
-                if (intToken % 100 == 0) and (intToken < 600):
-                    tokens[i] = digit2text[intToken]
-                # else:
-                #     tokens[i] = "-".join[digit2text[int(t)] for t in token]
-            elif len(token) == 4:
-                if (intToken == 1000) or (intToken == 2000):
-                    tokens[i] = digit2text[intToken]
-                # elif intToken % 100 == 0:
-                #     tokens[i] = digit2text[int(intToken//100)] + '-hundred'
-                # else:
-                #     tokens[i] = "-".join[digit2text[int(t)] for t in token]
-            elif len(token) == 5 and intToken == 10000:
-                tokens[i] = digit2text[intToken]
-            elif len(token) == 7 and intToken == 1000000:
-                tokens[i] = digit2text[intToken]
-
-    return ' '.join(tokens)
-
-
-def nums2GloVeWords(s, precision=2):
+def nums2GloVeWords(s, precision=2, numberWords=None):
     """
     INPUT:
         s				str, string to be converted, if digits
-        precision		int, number of digits of precision when summarizing s,
-                        default: 2, max=3
+        precision		int, number of significant digits kept when
+                        summarizing numbers in s, 1 to 4, default: 2
+        numberWords		NumberWords, to look numbers up in instead of the
+                        shared one for precision, e.g. one built with
+                        glove=True and vocab=GloVeDict(...), default: None
 
     Attempts to convert numbers into strings for which GloVe has embeddings.
     If s contains an integer string, this will return a string for a number
     approximately representing the integer. E.g.,
     '3235' --> 'thirty-two hundred', for precision == 2, or
-    '3235' --> '
+    '3235' --> 'thirty-two thirty', for precision == 3, or
     '3235' --> 'thirty-two thirty-five', for precision == 4
     """
 
     if s == '':
         return s
+    if numberWords is None:
+        numberWords = _numberWordsTable(precision, True)
+    return _nums2wordsText(s, numberWords.__getitem__)
 
-    if precision != 2:
-        raise NotImplemented("Only precision 2 implimented; you specified "
-                             f"{precision}.")
 
-    tokens = tokenizer.tokenize(s)
-    As = tokens[:-2]
-    Bs = tokens[1:-1]
-    Cs = tokens[2:]
-
-    for i, (a, b, c) in enumerate(zip(As, Bs, Cs)):
-        if a.isdigit() and c.isdigit() and (b in ['-', '–', '—']):
-            tokens[i + 1] = 'to'
-
-    tokens = list(map(lambda w: w.lower(), tokens))
-
-    for i, token in enumerate(tokens):
-        if token.isdigit():
-            intToken = int(token)
-            if intToken <= 20:
-                tokens[i] = digit2text[intToken]
-            elif len(token) == 2:
-                tens = int(token[0])
-                singles = int(token[1])
-                tokens[i] = digit2text[10*tens] + '-' + digit2text[singles]
-            elif len(token) == 3:
-                if intToken % 100 == 0:
-                    tokens[i] = digit2text[intToken]
-                # else:
-                #     tokens[i] = "-".join[digit2text[int(t)] for t in token]
-            elif len(token) == 4:
-                if (intToken == 1000) or (intToken == 2000):
-                    tokens[i] = digit2text[intToken]
-                # elif intToken % 100 == 0:
-                #     tokens[i] = digit2text[int(intToken//100)] + '-hundred'
-                # else:
-                #     tokens[i] = "-".join[digit2text[int(t)] for t in token]
-    return ' '.join(tokens)
+class _TokenWords(dict):
+    """
+    Token --> word substituted for it by a NumberWords, filling in tokens
+    (mostly words, mapping to themselves) as they are first looked up.
+    """
+
+    def __init__(self, numberWords):
+        super().__init__()
+        self.numberWords = numberWords
+
+    def __missing__(self, token):
+        word = self.numberWords[token]
+        self[token] = word
+        return word
+
+
+def _nums2wordsChunk(texts, numberWords):
+    """
+    nums2words() of each str of texts, looking the tokens up through one
+    _TokenWords table for the whole chunk.
+    """
+
+    lookup = _TokenWords(numberWords).__getitem__
+    return [_nums2wordsText(s, lookup) if isinstance(s, str) else s
+            for s in texts]
+
+
+def nums2wordsBatch(texts, precision=2, glove=False, nWorkers=1,
+                    chunkSz=100000, numberWords=None):
+    """
+    INPUT:
+        texts		pd.Series, np.ndarray or list(type=str); non-str
+                        entries (e.g. NaN) are passed through
+        precision	int, as for nums2words(), default: 2
+        glove		bool, if True, convert as nums2GloVeWords() does,
+                        rather than nums2words(), default: False
+        nWorkers	int, if > 1, chunks of texts are converted on a pool of
+                        this many processes, default: 1
+        chunkSz		int, texts per process-pool task, default: 100000
+        numberWords	NumberWords, to look numbers up in instead of the
+                        shared one for precision and glove, default: None
+
+    RETURNS:
+        converted	same type as texts (a pd.Series keeps its index), each
+                        entry as converted by nums2words() (or
+                        nums2GloVeWords())
+
+    Batch form of nums2words() and nums2GloVeWords(), for use instead of
+    Series.apply(): each text is tokenized with one compiled regex, ranges
+    are only looked for in texts with dashes, every token is mapped through
+    a table of precomputed number words (and of the other tokens seen so
+    far), and the joined text is lowercased once.
+    """
+
+    if numberWords is None:
+        numberWords = _numberWordsTable(precision, glove)
+
+    values = list(texts)
+    if nWorkers > 1:
+        with ProcessPoolExecutor(max_workers=nWorkers) as pool:
+            chunks = pool.map(_nums2wordsChunk,
+                              [values[i:i + chunkSz]
+                               for i in range(0, len(values), chunkSz)],
+                              [numberWords]*((len(values) - 1)//chunkSz + 1))
+            converted = [s for chunk in chunks for s in chunk]
+    else:
+        converted = _nums2wordsChunk(values, numberWords)
+
+    if isinstance(texts, pd.Series):
+        return pd.Series(converted, index=texts.index, name=texts.name,
+                         dtype=object)
+    elif isinstance(texts, np.ndarray):
+        return np.array(converted, dtype=object)
+    return converted
@@ -0,0 +1,371 @@
+import timeit
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from pathlib import Path
+
+
+def _topKRows(scores, k):
+    """
+    Returns the column indices and values of the k largest entries in each
+    row of scores, sorted in descending order.
+    """
+
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    partScores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-partScores, axis=1, kind='stable')
+    return (np.take_along_axis(part, order, axis=1),
+            np.take_along_axis(partScores, order, axis=1))
+
+
+class GloVeIndex:
+    """
+    INPUT:
+        vectors		np.ndarray or np.memmap, shape (vocab, dim), float32,
+                        unit-normed embedding vectors, e.g. GloVeStore.vectors
+                        from GloVeDict(GloVeDir, normed=True)
+        words		list(type=str), words labelling the rows of vectors
+        blockSz		int, number of vocabulary rows scored per matrix
+                        product in exact searches, default: 65536
+
+    Nearest-neighbour index over normalized word embeddings, with cosine
+    similarity computed as a dot product. Exact searches score the
+    vocabulary one block at a time, keeping a running top-k, so memory
+    stays bounded for large batches of queries. After buildIVF(), searches
+    may instead be approximate: vectors are grouped into nLists clusters by
+    spherical k-means, and only the nProbe clusters whose centroids are
+    closest to a query are scored.
+    """
+
+    def __init__(self, vectors, words, blockSz=65536):
+        if len(words) != vectors.shape[0]:
+            raise ValueError(f"Got {len(words)} words, but vectors has "
+                             f"{vectors.shape[0]} rows.")
+        self.vectors = vectors
+        self.words = list(words)
+        self.rows = dict(zip(self.words, range(len(self.words))))
+        self.blockSz = blockSz
+        self.centroids = None
+        self.order = None
+        self.listOffsets = None
+
+    @classmethod
+    def fromStore(cls, store, blockSz=65536):
+        """
+        INPUT:
+            store	GloVeStore, as returned by GloVeDict()
+        """
+
+        return cls(store.vectors, store.words, blockSz=blockSz)
+
+    def _queryVectors(self, queries):
+        """
+        Accepts a word, a list of words, or an array of (unnormalized)
+        vectors, and returns a 2-d float32 array of unit-normed queries.
+        """
+
+        if isinstance(queries, str):
+            queries = [queries]
+        if len(queries) == 0:
+            return np.zeros((0, self.vectors.shape[1]), dtype='float32')
+        if isinstance(queries[0], str):
+            Q = np.asarray(self.vectors[[self.rows[w] for w in queries]],
+                           dtype='float32')
+        else:
+            Q = np.atleast_2d(np.asarray(queries, dtype='float32'))
+        norms = np.linalg.norm(Q, axis=1, keepdims=True)
+        return Q / np.where(norms > 0.0, norms, 1.0)
+
+    def exactTopK(self, Q, k=10):
+        """
+        INPUT:
+            Q		np.ndarray, shape (queries, dim), unit-normed queries
+            k		int, number of neighbours, default: 10
+
+        RETURNS:
+            inds	np.ndarray, shape (queries, k), int64, row numbers of
+                        the neighbours, most similar first
+            scores	np.ndarray, shape (queries, k), float32, cosine
+                        similarities
+
+        Brute-force search, scoring blockSz vocabulary rows at a time.
+        """
+
+        nRows = self.vectors.shape[0]
+        bestInds = np.empty((Q.shape[0], 0), dtype='int64')
+        bestScores = np.empty((Q.shape[0], 0), dtype='float32')
+        for start in range(0, nRows, self.blockSz):
+            block = np.asarray(self.vectors[start:start + self.blockSz])
+            blockInds, blockScores = _topKRows(Q @ block.T, k)
+            inds = np.concatenate([bestInds, blockInds + start], axis=1)
+            scores = np.concatenate([bestScores, blockScores], axis=1)
+            keep, bestScores = _topKRows(scores, k)
+            bestInds = np.take_along_axis(inds, keep, axis=1)
+
+        return bestInds, bestScores
+
+    def buildIVF(self, nLists=None, nIter=10, sampleSz=100000,
+                 randomState=None, volubility=1):
+        """
+        INPUT:
+            nLists	int, number of clusters, default: None (4 sqrt(vocab))
+            nIter	int, k-means iterations, default: 10
+            sampleSz	int, number of vectors the centroids are trained on,
+                        default: 100000
+            randomState	np.random.RandomState or int, default: None (seed 21)
+            volubility	int, if > 0, print progress, default: 1
+
+        Trains centroids with spherical k-means on a sample of the vectors,
+        then assigns every vector to its closest centroid. Vectors are kept
+        in place; self.order lists row numbers grouped by cluster, with
+        cluster i occupying self.order[listOffsets[i]:listOffsets[i + 1]].
+        """
+
+        if randomState is None:
+            randomState = np.random.RandomState(21)
+        elif isinstance(randomState, int):
+            randomState = np.random.RandomState(randomState)
+
+        nRows = self.vectors.shape[0]
+        if nLists is None:
+            nLists = max(1, int(4*np.sqrt(nRows)))
+        sampleSz = min(sampleSz, nRows)
+        nLists = min(nLists, sampleSz)
+
+        sample = np.sort(randomState.choice(nRows, size=sampleSz,
+                                            replace=False))
+        X = np.asarray(self.vectors[sample], dtype='float32')
+        centroids = X[randomState.choice(X.shape[0], size=nLists,
+                                         replace=False)].copy()
+        for i in range(nIter):
+            assign = self._assign(X, centroids)
+            members = sp.csr_matrix((np.ones(X.shape[0], dtype='float32'),
+                                     (assign, np.arange(X.shape[0]))),
+                                    shape=(nLists, X.shape[0]))
+            sums = np.asarray(members @ X)
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0.0
+            sums[empty] = X[randomState.choice(X.shape[0],
+                                               size=np.count_nonzero(empty))]
+            norms[empty] = 1.0
+            centroids = sums / norms[:, np.newaxis]
+            if volubility > 0:
+                print(f"k-means iteration {i + 1}/{nIter}: "
+                      f"{np.count_nonzero(empty)} empty clusters re-seeded.")
+
+        assign = np.concatenate([
+            self._assign(np.asarray(self.vectors[start:start + self.blockSz]),
+                         centroids)
+            for start in range(0, nRows, self.blockSz)])
+        self.centroids = centroids.astype('float32')
+        self.order = np.argsort(assign, kind='stable')
+        self.listOffsets = np.zeros(nLists + 1, dtype='int64')
+        np.cumsum(np.bincount(assign, minlength=nLists),
+                  out=self.listOffsets[1:])
+
+    def _assign(self, X, centroids):
+        return np.concatenate([
+            np.argmax(X[start:start + self.blockSz] @ centroids.T, axis=1)
+            for start in range(0, X.shape[0], self.blockSz)])
+
+    def approxTopK(self, Q, k=10, nProbe=8):
+        """
+        INPUT:
+            Q		np.ndarray, shape (queries, dim), unit-normed queries
+            k		int, number of neighbours, default: 10
+            nProbe	int, number of clusters scored per query, default: 8
+
+        RETURNS:
+            inds, scores, as for exactTopK(); rows are padded with -1 (and
+            -inf scores) if the probed clusters hold fewer than k vectors.
+
+        Queries are grouped by the clusters they probe, so each probed
+        cluster is read, and scored against all of its queries, in one
+        matrix product; the top k of each (query, cluster) pair are then
+        merged per query.
+        """
+
+        if self.centroids is None:
+            raise ValueError("No IVF index; call buildIVF() or load() "
+                             "first.")
+
+        nQueries = Q.shape[0]
+        probes, _ = _topKRows(Q @ self.centroids.T, nProbe)
+        nProbe = probes.shape[1]
+        inds = np.full((nQueries, max(nProbe, 1)*k), -1, dtype='int64')
+        scores = np.full((nQueries, max(nProbe, 1)*k), -np.inf,
+                         dtype='float32')
+
+        pairQueries = np.repeat(np.arange(nQueries), nProbe)
+        pairSlots = np.tile(np.arange(nProbe), nQueries)
+        pairLists = probes.ravel()
+        byList = np.argsort(pairLists, kind='stable')
+        lists, starts = np.unique(pairLists[byList], return_index=True)
+        for p, pairs in zip(lists, np.split(byList, starts[1:])):
+            members = self.order[self.listOffsets[p]:self.listOffsets[p + 1]]
+            if len(members) == 0:
+                continue
+            queries = pairQueries[pairs]
+            listInds, listScores = _topKRows(
+                Q[queries] @ np.asarray(self.vectors[members]).T, k)
+            cols = (pairSlots[pairs][:, np.newaxis]*k
+                    + np.arange(listInds.shape[1]))
+            inds[queries[:, np.newaxis], cols] = members[listInds]
+            scores[queries[:, np.newaxis], cols] = listScores
+
+        keep, scores = _topKRows(scores, k)
+        return np.take_along_axis(inds, keep, axis=1), scores
+
+    def search(self, queries, k=10, exact=True, nProbe=8):
+        """
+        INPUT:
+            queries	str, list(type=str) or np.ndarray (queries, dim),
+                        words or vectors to search for
+            k		int, number of neighbours, default: 10
+            exact	bool, if False, use the IVF index, default: True
+            nProbe	int, clusters scored per query when exact is False,
+                        default: 8
+
+        RETURNS:
+            inds, scores, as for exactTopK()
+        """
+
+        Q = self._queryVectors(queries)
+        if exact:
+            return self.exactTopK(Q, k)
+        return self.approxTopK(Q, k, nProbe)
+
+    def mostSimilar(self, words, k=10, exact=True, nProbe=8):
+        """
+        INPUT:
+            words	str or list(type=str)
+            k		int, number of similar words, default: 10
+            exact	bool, default: True
+            nProbe	int, default: 8
+
+        RETURNS:
+            similar	list(type=list(type=tuple(str, float))), for each word,
+                        the k most similar other words and their cosine
+                        similarities
+        """
+
+        if isinstance(words, str):
+            words = [words]
+        inds, scores = self.search(words, k + 1, exact, nProbe)
+        return [self._labelled(rowInds, rowScores, {self.rows[w]}, k)
+                for w, rowInds, rowScores in zip(words, inds, scores)]
+
+    def analogy(self, a, b, c, k=10, exact=True, nProbe=8):
+        """
+        INPUT:
+            a, b, c	str or list(type=str), of equal lengths, for
+                        analogies a : b :: c : ?
+            k		int, number of answers, default: 10
+            exact	bool, default: True
+            nProbe	int, default: 8
+
+        RETURNS:
+            answers	list(type=list(type=tuple(str, float))), the k words
+                        closest to b - a + c, excluding a, b and c
+
+        E.g., analogy('man', 'king', 'woman') should rank 'queen' highly.
+        """
+
+        if isinstance(a, str):
+            a, b, c = [a], [b], [c]
+        ia = [self.rows[w] for w in a]
+        ib = [self.rows[w] for w in b]
+        ic = [self.rows[w] for w in c]
+        V = self.vectors
+        inds, scores = self.search(np.asarray(V[ib]) - np.asarray(V[ia])
+                                   + np.asarray(V[ic]), k + 3, exact, nProbe)
+        return [self._labelled(rowInds, rowScores, {x, y, z}, k)
+                for x, y, z, rowInds, rowScores
+                in zip(ia, ib, ic, inds, scores)]
+
+    def _labelled(self, inds, scores, exclude, k):
+        return [(self.words[i], float(s)) for i, s in zip(inds, scores)
+                if i >= 0 and i not in exclude][:k]
+
+    def save(self, indexPath):
+        """
+        INPUT:
+            indexPath	str or Path, .npz file for the IVF index, e.g. as
+                        returned by indexPathFor()
+        """
+
+        if self.centroids is None:
+            raise ValueError("No IVF index to save; call buildIVF() first.")
+        np.savez(indexPath, centroids=self.centroids, order=self.order,
+                 listOffsets=self.listOffsets,
+                 shape=np.array(self.vectors.shape))
+
+    def load(self, indexPath):
+        """
+        INPUT:
+            indexPath	str or Path, .npz file written by save()
+
+        Loads an IVF index built on the same vectors as this one.
+        """
+
+        with np.load(indexPath) as saved:
+            if tuple(saved['shape']) != tuple(self.vectors.shape):
+                raise ValueError(f"{indexPath} was built on vectors of shape "
+                                 f"{tuple(saved['shape'])}, not "
+                                 f"{tuple(self.vectors.shape)}.")
+            self.centroids = saved['centroids']
+            self.order = saved['order']
+            self.listOffsets = saved['listOffsets']
+
+
+def indexPathFor(storePath, nLists):
+    """
+    INPUT:
+        storePath	str or Path, the .npy GloVe cache file, e.g.
+                        'GloVe.6B.300normed.npy'
+        nLists		int, number of IVF clusters
+
+    Returns the path at which the IVF index for storePath is kept, in the
+    same directory, e.g. 'GloVe.6B.300normed.ivf1024.npz'.
+    """
+
+    storePath = Path(storePath)
+    return storePath.with_name(f"{storePath.stem}.ivf{nLists}.npz")
+
+
+def benchmarkIndex(index, queries, k=10, nProbes=(1, 4, 16, 64)):
+    """
+    INPUT:
+        index		GloVeIndex, with an IVF index built or loaded
+        queries		list(type=str) or np.ndarray, as for search()
+        k		int, number of neighbours, default: 10
+        nProbes		iterable(type=int), nProbe values to try,
+                        default: (1, 4, 16, 64)
+
+    RETURNS:
+        results		pd.DataFrame, indexed by nProbe (0 for exact search),
+                        with recall@k against the exact results and mean
+                        latency in ms per query
+    """
+
+    Q = index._queryVectors(queries)
+    t0 = timeit.default_timer()
+    exactInds, _ = index.exactTopK(Q, k)
+    t1 = timeit.default_timer()
+
+    rows = [{'nProbe': 0, 'recall': 1.0,
+             'msPerQuery': 1000*(t1 - t0)/Q.shape[0]}]
+    for nProbe in nProbes:
+        t0 = timeit.default_timer()
+        approxInds, _ = index.approxTopK(Q, k, nProbe)
+        t1 = timeit.default_timer()
+        hits = sum(np.intersect1d(e, a).shape[0]
+                   for e, a in zip(exactInds, approxInds))
+        rows.append({'nProbe': nProbe, 'recall': hits/exactInds.size,
+                     'msPerQuery': 1000*(t1 - t0)/Q.shape[0]})
+
+    return pd.DataFrame(rows).set_index('nProbe')
@@ -1,6 +1,18 @@
 from symspellpy.symspellpy import SymSpell
 import pkg_resources
+import os
+import re
+import copy
+import pickle
+import timeit
+import threading
+import multiprocessing as mp
+from pathlib import Path
+import numpy as np
+import pandas as pd
 from itertools import islice
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 from nltk.tokenize import word_tokenize, sent_tokenize
 import string
@@ -22,20 +34,62 @@ def categorizeWords(sent):
     as spell checking.
     """
 
-    returnArr = []
-    for word in sent:
-        capCt = sum(1 for c in word if c.isupper())
+    return categorizeTokens(sent).tolist()
 
-        if capCt == 0:
-            returnArr.append(0)
-        elif capCt == len(word):
-            returnArr.append(2)
-        elif capCt == 1 and word[0].isupper():
-            returnArr.append(1)
-        else:
-            returnArr.append(3)
 
-    return returnArr
+def categorizeTokens(tokens):
+    """
+    tokens		list(type=str), e.g. the words of many sentences,
+                        concatenated
+
+    Returns an np.ndarray (dtype int8) of the casing categories of tokens,
+    as for categorizeWords(). (As there, single capital letters, such as
+    'I', fall in category 2, since all of their letters are capitals.)
+
+    All tokens are joined into one string, which is converted to an array
+    of code points; capitals are flagged by range for ASCII and with
+    str.isupper() once per distinct non-ASCII character, and per-token
+    capital counts come from a single cumulative sum.
+    """
+
+    lengths = np.fromiter((len(t) for t in tokens), dtype='int64',
+                          count=len(tokens))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    codes = np.frombuffer(''.join(tokens).encode('utf-32-le'), dtype='<u4')
+    isUpper = (codes >= 65) & (codes <= 90)
+    nonAscii = codes >= 128
+    if nonAscii.any():
+        uniq, inverse = np.unique(codes[nonAscii], return_inverse=True)
+        upperFlags = np.array([chr(c).isupper() for c in uniq], dtype=bool)
+        isUpper[nonAscii] = upperFlags[inverse]
+
+    capCumSum = np.concatenate(([0], np.cumsum(isUpper)))
+    capCts = capCumSum[ends] - capCumSum[starts]
+    firstUpper = np.zeros(len(tokens), dtype=bool)
+    nonEmpty = lengths > 0
+    firstUpper[nonEmpty] = isUpper[starts[nonEmpty]]
+
+    categories = np.full(len(tokens), 3, dtype='int8')
+    categories[(capCts == 1) & firstUpper] = 1
+    categories[capCts == lengths] = 2
+    categories[capCts == 0] = 0
+    return categories
+
+
+def categorizeSentences(sentences):
+    """
+    sentences		list(type=list(type=str)), tokenized sentences
+
+    Returns categories, offsets: categories is the flat int8 np.ndarray of
+    categorizeTokens() over all words, and the words of sentence i have
+    categories[offsets[i]:offsets[i + 1]].
+    """
+
+    offsets = np.zeros(len(sentences) + 1, dtype='int64')
+    np.cumsum([len(sent) for sent in sentences], out=offsets[1:])
+    return categorizeTokens([w for sent in sentences for w in sent]), offsets
 
 
 def has2VocabWords(sentence, vocab):
@@ -57,7 +111,231 @@ def has2VocabWords(sentence, vocab):
     return False
 
 
-def initializeSymspell():
+class VocabPrefilter:
+    """
+    vocab		set, vocabulary from symspell dictionaries
+
+    Screens batches of sentences against vocab without nltk tokenization.
+    Sentences are split into word and punctuation runs by one compiled
+    regex, and all tokens of a batch are looked up at once in a hashed
+    index built from vocab.
+
+    The screen is conservative: any punctuation makes a sentence
+    "not clean", and so does any of splitWords, the words without
+    punctuation that word_tokenize() splits in two (e.g. 'gonna' -->
+    'gon', 'na'), and which are, here, treated as not in vocab. So, as
+    long as word_tokenize() splits words only at punctuation and at
+    splitWords (as nltk's does), a sentence reported clean is one that
+    symSpellLine() would also return unchanged. Only the rest need go to
+    SymSpell.
+    """
+
+    tokenPattern = re.compile(r"\w+|[^\w\s]+")
+    splitWords = frozenset(['cannot', 'gimme', 'gonna', 'gotta', 'lemme',
+                            'wanna'])
+
+    def __init__(self, vocab):
+        self.index = pd.Index([w for w in vocab
+                               if w.lower() not in self.splitWords])
+        self.index.get_indexer(['_'])		# builds the hash table now
+
+    def _tokenHits(self, sentences, lower):
+        tokens = [self.tokenPattern.findall(s.lower() if lower else s)
+                  for s in sentences]
+        lengths = np.fromiter((len(t) for t in tokens), dtype='int64',
+                              count=len(tokens))
+        flat = [token for sentTokens in tokens for token in sentTokens]
+        hits = self.index.get_indexer(flat) >= 0
+        sentIds = np.repeat(np.arange(len(sentences)), lengths)
+        return sentIds, hits, lengths
+
+    def inVocab(self, sentences):
+        """
+        sentences	list(type=str)
+
+        Returns a bool np.ndarray, True for sentences all of whose tokens
+        are in vocab (case-sensitively, as in symSpellLine()).
+        """
+
+        sentIds, hits, lengths = self._tokenHits(sentences, lower=False)
+        misses = np.bincount(sentIds[~hits], minlength=len(sentences))
+        return misses == 0
+
+    def vocabCounts(self, sentences):
+        """
+        sentences	list(type=str)
+
+        Returns an int np.ndarray of the number of lower-cased tokens of
+        each sentence that are in vocab (but for splitWords); e.g.
+        vocabCounts(sentences) > 1 is a batch has2VocabWords().
+        """
+
+        sentIds, hits, lengths = self._tokenHits(sentences, lower=True)
+        return np.bincount(sentIds[hits], minlength=len(sentences))
+
+
+class LRUCache:
+    """
+    maxSize		int, max number of entries, default: 100000
+    maxWeight		int, max total weight of entries, or None for no
+                        limit, default: None
+    weigh		function, returning the weight of a (key, value) pair,
+                        e.g. lambda k, v: len(k) + len(v) to bound the
+                        characters held, default: None (each entry weighs 1)
+
+    Thread-safe, bounded mapping that evicts least recently used entries
+    once either bound is exceeded, and counts hits, misses and evictions.
+    """
+
+    def __init__(self, maxSize=100000, maxWeight=None, weigh=None):
+        self.maxSize = maxSize
+        self.maxWeight = maxWeight
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _weight(self, key, value):
+        return 1 if self.weigh is None else self.weigh(key, value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self.weight -= self._weight(key, self._entries.pop(key))
+            self._entries[key] = value
+            self.weight += self._weight(key, value)
+            while len(self._entries) > self.maxSize or \
+                (self.maxWeight is not None and self.weight > self.maxWeight
+                 and len(self._entries) > 1):
+                oldKey, oldValue = self._entries.popitem(last=False)
+                self.weight -= self._weight(oldKey, oldValue)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'weight': self.weight,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hitRate': self.hits/lookups if lookups else 0.0}
+
+
+class CachedSymSpell(SymSpell):
+    """
+    symSpell		SymSpell object, whose dictionaries are shared, not
+                        copied
+    tokens		LRUCache, of lookup() suggestions
+
+    SymSpell whose lookup() is served from tokens, keyed on its arguments,
+    so that lookup_compound(), which calls lookup() for each token and pair
+    of tokens, only looks up each once. Cached suggestions are copied on the
+    way out, since lookup_compound() modifies them.
+    """
+
+    def __init__(self, symSpell, tokens):
+        # Takes over symSpell's attributes, which refer to the same
+        # dictionaries, rather than building empty ones.
+        self.__dict__.update(vars(symSpell))
+        self._tokenCache = tokens
+
+    def lookup(self, phrase, verbosity, max_edit_distance=None, *args,
+               **kwds):
+        key = (phrase, verbosity, max_edit_distance, args,
+               tuple(sorted(kwds.items())))
+        suggestions = self._tokenCache.get(key)
+        if suggestions is None:
+            suggestions = super().lookup(phrase, verbosity, max_edit_distance,
+                                         *args, **kwds)
+            self._tokenCache.put(key, [copy.copy(s) for s in suggestions])
+        return [copy.copy(s) for s in suggestions]
+
+
+class SymSpellCache:
+    """
+    maxSentences	int, max number of cached sentence corrections,
+                        default: 100000
+    maxTokenized	int, max number of cached sentence tokenizations,
+                        default: 100000
+    maxTokens		int, max number of cached token lookups,
+                        default: 100000
+    maxChars		int, if not None, max number of characters (of keys
+                        and values) held by each of the three caches, on
+                        top of the counts, default: None
+
+    Three-level memo for symSpellLine() and symSpellSentence(): corrections
+    keyed on the whitespace-normalized sentence; the word_tokenize() output
+    of each sentence, which is otherwise computed repeatedly for
+    boilerplate such as headers and footers; and, for sentences that do
+    need correcting, SymSpell's lookup() of each token, so a misspelling
+    repeated across different sentences is only looked up once. Safe to
+    share between threads.
+    """
+
+    def __init__(self, maxSentences=100000, maxTokenized=100000,
+                 maxTokens=100000, maxChars=None):
+        self.sentences = LRUCache(
+            maxSentences, maxChars,
+            lambda k, v: len(k[0]) + (0 if v is True else len(v)))
+        self.tokenized = LRUCache(
+            maxTokenized, maxChars,
+            lambda k, v: len(k) + sum(len(w) for w in v))
+        self.tokens = LRUCache(
+            maxTokens, maxChars,
+            lambda k, v: len(k[0]) + sum(len(s.term) for s in v))
+
+    def tokenize(self, sent):
+        words = self.tokenized.get(sent)
+        if words is None:
+            words = word_tokenize(sent)
+            self.tokenized.put(sent, words)
+        return words
+
+    def lookups(self, symSpell):
+        """
+        Returns a CachedSymSpell sharing symSpell's dictionaries, with its
+        lookup() served from this cache.
+        """
+
+        return CachedSymSpell(symSpell, self.tokens)
+
+    def stats(self):
+        return {'sentences': self.sentences.stats(),
+                'tokenized': self.tokenized.stats(),
+                'tokens': self.tokens.stats()}
+
+
+def initializeSymspell(snapshotPath=None):
+    """
+    snapshotPath	str or Path, snapshot file written by
+                        saveSymspellSnapshot(), default: None
+
+    Returns a SymSpell object loaded with symspellpy's unigram and bigram
+    frequency dictionaries (plus a few custom entries), and the set of its
+    words. If snapshotPath exists, both are simply loaded from it; if
+    snapshotPath is given but does not (yet) exist, the dictionaries are
+    built and then saved there, so later calls can load them quickly.
+    """
+
+    if snapshotPath is not None and Path(snapshotPath).exists():
+        return loadSymspellSnapshot(snapshotPath)
+
     print("inside initializeSymspell()")
     symspell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
     print("symspell created")
@@ -83,34 +361,106 @@ def initializeSymspell():
     # Create vocab
     vocab = set([w for w, f in symspell.words.items()])
 
+    if snapshotPath is not None:
+        saveSymspellSnapshot(symspell, vocab, snapshotPath)
+
     return symspell, vocab
 
 
-def symSpellLine(symSpell, vocab, sent, maxEditDist=2):
+def saveSymspellSnapshot(symspell, vocab, snapshotPath):
+    """
+    symspell		symspell object, fully initialized
+    vocab		set, vocabulary from symspell dictionaries
+    snapshotPath	str or Path, file to write
+
+    Pickles the SymSpell object, including its precomputed deletes, bigrams
+    and any custom entries, together with vocab, so that workers can load
+    them instead of rebuilding the dictionaries.
+    """
+
+    print(f"Saving symspell snapshot to {snapshotPath}.")
+    with open(snapshotPath, 'wb') as snapshotFile:
+        pickle.dump((symspell, vocab), snapshotFile, -1)
+
+
+def loadSymspellSnapshot(snapshotPath):
+    """
+    snapshotPath	str or Path, file written by saveSymspellSnapshot()
+
+    Returns symspell, vocab. Load once in a parent process before forking
+    workers (as symSpellDocStream() does), and the workers share the
+    parent's copy of the dictionaries until they write to them.
+    """
+
+    print(f"Loading symspell snapshot from {snapshotPath} ...")
+    with open(snapshotPath, 'rb') as snapshotFile:
+        return pickle.load(snapshotFile)
+
+
+def symSpellLine(symSpell, vocab, sent, maxEditDist=2, cache=None):
     """
     symSpell		symspell object
     sent		list(type=str) containing str from nltk's
                         sent_tokenize()
+    cache		SymSpellCache, memoizing corrections of repeated
+                        sentences, default: None
     """
+    if cache is not None:
+        key = (' '.join(sent.split()), maxEditDist)
+        corrected = cache.sentences.get(key)
+        if corrected is not None:
+            return sent if corrected is True else corrected
+        words = cache.tokenize(sent)
+    else:
+        words = word_tokenize(sent)
+
     OK = True
-    words = word_tokenize(sent)
     for word in words:
         if word not in vocab:
             OK = False
             break
     if OK:
+        if cache is not None:
+            cache.sentences.put(key, True)
         return sent
     else:
         line = []
-        suggestions = symSpell.lookup_compound(sent, transfer_casing=True,
-                                               max_edit_distance=maxEditDist)
-        for i, suggestion in enumerate(suggestions):
+        if cache is not None:
+            suggestions = cache.lookups(symSpell).lookup_compound(
+                sent, transfer_casing=True, max_edit_distance=maxEditDist)
+        else:
+            suggestions = symSpell.lookup_compound(
+                sent, transfer_casing=True, max_edit_distance=maxEditDist)
+        for suggestion in suggestions:
             line.append(suggestion._term)
-            print(f"{i:02d}: {type(suggestion)}\t{suggestion}")
 
+        if cache is not None:
+            cache.sentences.put(key, " ".join(line))
         return " ".join(line)
 
 
+def symSpellLines(symSpell, vocab, sentences, maxEditDist=2, prefilter=None,
+                  cache=None):
+    """
+    symSpell		symspell object
+    vocab		set, containing vocab from symspell dictionaries
+    sentences		list(type=str), sentences from nltk's sent_tokenize()
+    prefilter		VocabPrefilter, built from vocab, default: None (one
+                        is built for this call)
+    cache		SymSpellCache, default: None
+
+    Returns the list of corrected sentences, as from symSpellLine(), but
+    passes only sentences not screened clean by prefilter to symSpellLine().
+    """
+
+    if prefilter is None:
+        prefilter = VocabPrefilter(vocab)
+    clean = prefilter.inVocab(sentences)
+    return [sent if ok else symSpellLine(symSpell, vocab, sent, maxEditDist,
+                                         cache)
+            for sent, ok in zip(sentences, clean)]
+
+
 def bestSymspelledLine(words, symSpell, vocab, line):
     wordCategories = categorizeWords(words)
     symspelledLine = symSpellLine(symSpell, vocab, line)
@@ -133,33 +483,201 @@ def bestSymspelledLine(words, symSpell, vocab, line):
     return bestLine
 
 
-def symSpellDoc(symSpell, vocab, text):
+def symSpellSentence(symSpell, vocab, line, maxEditDist=2, cache=None):
+    """
+    symSpell		symspell object
+    vocab		set, containing vocab from symspell dictionaries
+    line		str, a sentence, as from nltk's sent_tokenize()
+    cache		SymSpellCache, default: None
+
+    Returns the spell corrected sentence, or None if it looks like garbage
+    (a single word not in vocab, or fewer than two words in vocab), as when
+    originating from smudges on an image.
+    """
+
+    words = word_tokenize(line) if cache is None else cache.tokenize(line)
+    if (len(words) == 1 and words[0] in vocab) \
+       or has2VocabWords(words, vocab):
+        return symSpellLine(symSpell, vocab, line, maxEditDist=maxEditDist,
+                            cache=cache)
+    return None
+
+
+def symSpellSentences(symSpell, vocab, lines, maxEditDist=2, cache=None,
+                      prefilter=None):
+    """
+    symSpell		symspell object
+    vocab		set, containing vocab from symspell dictionaries
+    lines		list(type=str), sentences, as from nltk's
+                        sent_tokenize()
+    cache		SymSpellCache, default: None
+    prefilter		VocabPrefilter, built from vocab, default: None
+
+    Returns the list of symSpellSentence() of each line. With prefilter,
+    the lines it screens clean are passed through as they are (which is
+    what symSpellSentence() returns for them), and only the rest are
+    tokenized and corrected.
+    """
+
+    if prefilter is None:
+        return [symSpellSentence(symSpell, vocab, line, maxEditDist, cache)
+                for line in lines]
+
+    clean = prefilter.inVocab(lines)
+    return [line if ok and line.strip() else
+            symSpellSentence(symSpell, vocab, line, maxEditDist, cache)
+            for line, ok in zip(lines, clean)]
+
+
+def symSpellDoc(symSpell, vocab, text, maxEditDist=2, cache=None,
+                prefilter=None):
     """
     symSpell		symspell object
     vocab		set, containing vocab from symspell dictionaries
     text		str, containing text to be fixed up
+    cache		SymSpellCache, default: None
+    prefilter		VocabPrefilter, built from vocab, to pass sentences
+                        that are already clean straight through, as in
+                        symSpellSentences(), default: None
 
     Breaks text into blocks by splitting on '\n\n', sentence tokenizes each
     block (preserving case), spell corrects using symspell on each sentence,
     and then reconstructs text.
 
-    Prior to sentence tokenization, requires that at least one word in text is
-    in vocab, in an effort to remove blocks originating from smudges on image.
+    Prior to correction, requires that a sentence is a single word in vocab,
+    or has at least two words in vocab, in an effort to remove sentences
+    originating from smudges on image.
     """
-    blocks = text.split('\n\n')
 
+    blocks = [sent_tokenize(block) for block in text.split('\n\n')]
+    sentences = symSpellSentences(symSpell, vocab,
+                                  [line for block in blocks for line in block],
+                                  maxEditDist, cache, prefilter)
     paragraphs = []
+    i = 0
     for block in blocks:
-        lines = sent_tokenize(block)
+        paragraphs.append(' '.join(s for s in sentences[i:i + len(block)]
+                                   if s is not None))
+        i += len(block)
+
+    return '\n\n'.join(paragraphs)
+
+
+# Per-process SymSpell object, vocab, cache and prefilter, set by
+# _initStreamWorker() in each worker of symSpellDocStream()'s process pool.
+_workerSymSpell = None
+_workerVocab = None
+_workerCache = None
+_workerPrefilter = None
+
 
-        sentences = []
-        for line in lines:
-            words = word_tokenize(line)
-            if (len(words) == 1 and words[0] in vocab) \
-               or has2ValidWords(words, vocab):
-                sentences.append(bestSymspelledLine(words, symspell, line))
-            # else drop the line as garbage
+def _initStreamWorker(snapshotPath, cacheSz, symSpell=None, vocab=None):
+    global _workerSymSpell, _workerVocab, _workerCache, _workerPrefilter
+    if symSpell is None:		# i.e., not loaded before forking
+        symSpell, vocab = initializeSymspell(snapshotPath)
+    _workerSymSpell, _workerVocab = symSpell, vocab
+    _workerPrefilter = VocabPrefilter(vocab)
+    _workerCache = SymSpellCache(cacheSz, cacheSz) if cacheSz > 0 else None
 
-    doc = '\n\n'.join(blocks)
 
-    return doc
+def _correctSentences(sentences, maxEditDist):
+    return symSpellSentences(_workerSymSpell, _workerVocab, sentences,
+                             maxEditDist, _workerCache, _workerPrefilter)
+
+
+def symSpellDocStream(docs, nWorkers=None, batchSz=64, maxPending=None,
+                      maxEditDist=2, stats=None, reportEvery=1000,
+                      snapshotPath=None, cacheSz=100000):
+    """
+    docs		iterable(type=str), documents (e.g. OCR'd pages)
+    nWorkers		int, number of worker processes, default: None
+                        (os.cpu_count())
+    batchSz		int, max number of sentences sent to a worker at once,
+                        default: 64
+    maxPending		int, max number of batches, and of documents, in
+                        flight, which bounds memory use, default: None
+                        (4*nWorkers)
+    maxEditDist		int, default: 2
+    stats		dict, if not None, updated with counts of 'pages' and
+                        'sentences', 'seconds' elapsed and 'pagesPerSec',
+                        default: None
+    reportEvery		int, print throughput after every reportEvery pages,
+                        or never if 0, default: 1000
+    snapshotPath	str or Path, symspell snapshot, as for
+                        initializeSymspell(), default: None
+    cacheSz		int, size of each worker's SymSpellCache, or 0 for no
+                        caching, default: 100000
+
+    Generator yielding the documents corrected as by symSpellDoc(), in input
+    order. Documents are split into blocks and sentences in this process;
+    the sentences are sent in batches to a pool of worker processes, each of
+    which holds one SymSpell object, created once when the worker starts,
+    and a VocabPrefilter, through which clean sentences skip correction.
+    With snapshotPath, the snapshot is loaded once here, before the workers
+    are forked, and they share it (where processes are spawned instead, each
+    worker loads the snapshot itself).
+    Only up to maxPending batches, and maxPending documents (which may have
+    no sentences, so no batches), are outstanding at any time, so docs may
+    be an unbounded stream.
+    """
+
+    if nWorkers is None:
+        nWorkers = os.cpu_count()
+    if maxPending is None:
+        maxPending = 4*nWorkers
+    if stats is None:
+        stats = {}
+    stats.update({'pages': 0, 'sentences': 0, 'seconds': 0.0,
+                  'pagesPerSec': 0.0})
+
+    t0 = timeit.default_timer()
+    pending = deque()		# (block sentence counts, futures) per doc
+    inFlight = 0
+
+    def finishOldest():
+        blockCts, futures = pending.popleft()
+        sentences = [s for future in futures for s in future.result()]
+        paragraphs = []
+        i = 0
+        for ct in blockCts:
+            paragraphs.append(' '.join(s for s in sentences[i:i + ct]
+                                       if s is not None))
+            i += ct
+
+        stats['pages'] += 1
+        stats['sentences'] += len(sentences)
+        stats['seconds'] = timeit.default_timer() - t0
+        stats['pagesPerSec'] = stats['pages']/stats['seconds']
+        if reportEvery > 0 and stats['pages'] % reportEvery == 0:
+            print(f"{stats['pages']} pages, {stats['sentences']} sentences:"
+                  f" {stats['pagesPerSec']:.1f} pages/s.")
+
+        return len(futures), '\n\n'.join(paragraphs)
+
+    # Passed to the workers as initializer arguments, which forked workers
+    # inherit without pickling, rather than through this process's globals,
+    # so nothing outlives the stream, or leaks into later streams.
+    symSpell = vocab = None
+    if snapshotPath is not None and mp.get_start_method() == 'fork':
+        symSpell, vocab = initializeSymspell(snapshotPath)
+
+    with ProcessPoolExecutor(max_workers=nWorkers,
+                             initializer=_initStreamWorker,
+                             initargs=(snapshotPath, cacheSz, symSpell,
+                                       vocab)) as pool:
+        for doc in docs:
+            blocks = [sent_tokenize(block) for block in doc.split('\n\n')]
+            sentences = [line for block in blocks for line in block]
+            futures = [pool.submit(_correctSentences,
+                                   sentences[i:i + batchSz], maxEditDist)
+                       for i in range(0, len(sentences), batchSz)]
+            pending.append(([len(block) for block in blocks], futures))
+            inFlight += len(futures)
+            while inFlight >= maxPending or len(pending) >= maxPending:
+                ct, corrected = finishOldest()
+                inFlight -= ct
+                yield corrected
+
+        while pending:
+            ct, corrected = finishOldest()
+            yield corrected
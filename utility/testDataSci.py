@@ -6,6 +6,7 @@ import scipy.sparse as sp
 from random import seed
 from collections import OrderedDict
 from os import system
+import timeit
 
 
 def testSplitDataFrameByClasses():
@@ -43,6 +44,49 @@ def testSplitDataFrameByClasses():
     assert expectedTestValCts.equals(dfTest[classColumn].value_counts())
 
 
+def testSplitDataFrameByClassesMatchesLoop():
+
+    # Compares against the original per-class mask / train_test_split /
+    # concat loop, for the same seed, and prints the timing of each.
+    randState = np.random.RandomState(5)
+    nRows, nClasses = 200000, 500
+    df = pd.DataFrame({'values': randState.randn(nRows),
+                       'class': randState.randint(0, nClasses, size=nRows)})
+    df.index = df.index*3
+
+    for randomizeResult in [True, False]:
+        t0 = timeit.default_timer()
+        myRandomState = np.random.RandomState(21)
+        for i, label in enumerate(list(set(df['class']))):
+            dfLabelTrain, dfLabelTest = \
+                train_test_split(df[df['class'] == label], test_size=0.25,
+                                 random_state=myRandomState)
+            if i == 0:
+                expectedTrain, expectedTest = dfLabelTrain, dfLabelTest
+            else:
+                expectedTrain = pd.concat([expectedTrain, dfLabelTrain])
+                expectedTest = pd.concat([expectedTest, dfLabelTest])
+        if randomizeResult:
+            expectedTrain = expectedTrain.sample(frac=1,
+                                                 random_state=myRandomState)\
+                                         .reset_index(drop=True)
+            expectedTest = expectedTest.sample(frac=1,
+                                               random_state=myRandomState)\
+                                       .reset_index(drop=True)
+        t1 = timeit.default_timer()
+        dfTrain, dfTest = \
+            splitDataFrameByClasses(df, 'class', testFrac=0.25, volubility=0,
+                                    randomizeResult=randomizeResult,
+                                    myRandomState=21)
+        t2 = timeit.default_timer()
+        print(f"per-class loop: {t1 - t0:6.3f}s\tsingle pass: "
+              f"{t2 - t1:6.3f}s")
+
+        assert dfTrain.equals(expectedTrain)
+        assert dfTest.equals(expectedTest)
+        assert dfTrain.index.equals(expectedTrain.index)
+
+
 def testSplitBalanceDataFrameByClasses():
 
     randState = np.random.RandomState(26)
@@ -87,6 +131,208 @@ def testSplitBalanceDataFrameByClasses():
     assert expectedTestValCts.equals(dfTest[classColumn].value_counts())
 
 
+def testBalanceClassPositions():
+
+    randState = np.random.RandomState(8)
+    nClasses = 2000
+    classCts = randState.randint(1, 200, size=nClasses)
+    classCodes = np.repeat(np.arange(nClasses), classCts)
+    positions = randState.permutation(len(classCodes)).astype('int64')
+    targetSizes = randState.randint(0, 200, size=nClasses)
+
+    t0 = timeit.default_timer()
+    balanced = balanceClassPositions(positions, classCodes, targetSizes,
+                                     randState)
+    print(f"{nClasses} classes: {timeit.default_timer() - t0:6.3f}s")
+
+    codeOf = np.empty(len(positions), dtype='int64')
+    codeOf[positions] = classCodes
+    balancedCodes = codeOf[balanced]
+    assert np.all(np.diff(balancedCodes) >= 0)
+    assert np.array_equal(np.bincount(balancedCodes, minlength=nClasses),
+                          targetSizes)
+    # Down-sampled classes have no repeats.
+    for c in np.flatnonzero(classCts >= targetSizes)[:50]:
+        kept = balanced[balancedCodes == c]
+        assert len(np.unique(kept)) == len(kept)
+
+    try:
+        balanceClassPositions(positions, classCodes,
+                              np.append(targetSizes, 1), randState)
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised
+
+
+def testSplitBalanceTargets():
+
+    df = pd.DataFrame({'values': np.arange(1100),
+                       'class': ['a']*100 + ['b']*1000})
+
+    # Class 'a' has 67 train rows, but 33 test rows, so with a target of 50
+    # it must be down-sampled without replacement.
+    trainIdx, testIdx = \
+        splitBalanceDataFrameByClasses(df, 'class', 50, volubility=0,
+                                       returnIndices=True)
+    aIdx = trainIdx[df['class'].to_numpy()[trainIdx] == 'a']
+    assert len(aIdx) == 50 and len(np.unique(aIdx)) == 50
+
+    dfTrain, dfTest = \
+        splitBalanceDataFrameByClasses(df, 'class', {'a': 300},
+                                       volubility=0)
+    assert dfTrain['class'].value_counts().to_dict() == {'b': 670, 'a': 300}
+    assert dfTest['class'].value_counts().to_dict() == {'b': 330, 'a': 33}
+
+    dfTrain, dfTest = \
+        splitBalanceDataFrameByClasses(df, 'class',
+                                       lambda n: min(n, 200), volubility=0)
+    assert dfTrain['class'].value_counts().to_dict() == {'b': 200, 'a': 67}
+
+
+def testSplitReturnIndices():
+
+    randState = np.random.RandomState(26)
+    vals = randState.randint(0, 100000, size=10000)
+    classes = ['a' if v < 1000 else 'b' if v < 10000 else 'c' for v in vals]
+    df = pd.DataFrame({'values': vals, 'class': classes})
+    X = sp.csr_matrix(vals.reshape(-1, 1))
+
+    for splitter, kwds in [(splitDataFrameByClasses, {}),
+                           (splitBalanceDataFrameByClasses,
+                            {'targetClassSize': 500})]:
+        dfTrain, dfTest = splitter(df, 'class', testFrac=0.25,
+                                   myRandomState=4, volubility=0, **kwds)
+        trainIdx, testIdx = splitter(df, 'class', testFrac=0.25,
+                                     myRandomState=4, volubility=0,
+                                     returnIndices=True, **kwds)
+        assert trainIdx.dtype == np.int64 and testIdx.dtype == np.int64
+        assert df.take(trainIdx).reset_index(drop=True).equals(dfTrain)
+        assert df.take(testIdx).reset_index(drop=True).equals(dfTest)
+        assert np.array_equal(X[testIdx].toarray().ravel(), dfTest['values'])
+
+    assert (df['class'].iloc[trainIdx].value_counts() == 500).all()
+
+
+def testSplitStreamByClasses(tmp_path):
+
+    randState = np.random.RandomState(15)
+    nRows = 5000
+    df = pd.DataFrame({'id': np.arange(nRows),
+                       'values': randState.randn(nRows),
+                       'class': randState.choice(['a', 'b', 'c'], nRows,
+                                                 p=[0.01, 0.19, 0.8])})
+    # With a NaN, pandas parses the ids of a chunk as floats, or as ints in
+    # chunks without one.
+    df['id'] = df['id'].astype(object)
+    df.loc[10, 'id'] = np.nan
+    inPaths = [tmp_path / 'part0.csv', tmp_path / 'part1.csv']
+    df.iloc[:3000].to_csv(inPaths[0], index=False)
+    df.iloc[3000:].to_csv(inPaths[1], index=False)
+
+    def readSplit(outDir, split):
+        return pd.concat([pd.read_csv(path) for path in
+                          sorted((outDir / split).glob('part-*.csv'))])
+
+    testIds = {}
+    for method in ['hash', 'exact']:
+        for chunkSz in [700, 10000]:
+            outDir = tmp_path / f"{method}{chunkSz}"
+            counts = splitStreamByClasses(inPaths, 'class', outDir,
+                                          keyColumn='id', testFrac=0.25,
+                                          method=method, chunkSz=chunkSz,
+                                          volubility=0)
+            dfTrain = readSplit(outDir, 'train')
+            dfTest = readSplit(outDir, 'test')
+            assert len(dfTrain) + len(dfTest) == nRows
+            assert counts.loc['c', 'test'] == \
+                np.count_nonzero(dfTest['class'] == 'c')
+            n = counts['train'] + counts['test']
+            if method == 'exact':
+                # Stratified: each class is split to the nearest row.
+                assert ((counts['test'] - 0.25*n).abs() <= 0.5).all()
+            else:
+                # Decided row by row: within 4 standard deviations.
+                assert ((counts['testFrac'] - 0.25).abs()
+                        <= 4*np.sqrt(0.25*0.75/n)).all()
+            testIds[method, chunkSz] = sorted(dfTest['id'].fillna(-1))
+        # Assignments don't depend on chunking, or on how ids were parsed.
+        assert testIds[method, 700] == testIds[method, 10000]
+
+    # The whole row hashed, with no test rows: no empty test shards.
+    outDir = tmp_path / 'noTest'
+    counts = splitStreamByClasses(inPaths, 'class', outDir, testFrac=0.0,
+                                  chunkSz=700, volubility=0)
+    assert counts['test'].sum() == 0
+    assert list((outDir / 'test').iterdir()) == []
+    assert len(list((outDir / 'train').iterdir())) == 8
+
+    outDir = tmp_path / 'counter'
+    counts = splitStreamByClasses(inPaths, 'class', outDir, testFrac=0.25,
+                                  method='counter', chunkSz=700,
+                                  volubility=0)
+    assert counts['train'].sum() + counts['test'].sum() == nRows
+    assert ((counts['test'] - 0.25*(counts['train'] + counts['test'])).abs()
+            <= 1).all()
+    assert len(readSplit(outDir, 'test')) == counts['test'].sum()
+
+
+def testBalancedBatchSampler():
+
+    df = pd.DataFrame({'values': np.arange(1100),
+                       'class': ['a']*20 + ['b']*80 + ['c']*1000})
+    trainIdx, testIdx = splitDataFrameByClasses(df, 'class', testFrac=0.25,
+                                                volubility=0,
+                                                returnIndices=True)
+    classes = df['class'].to_numpy()[trainIdx]
+
+    sampler = BalancedBatchSampler(trainIdx, classes, batchSz=64, seed=3)
+    assert len(sampler) == int(np.ceil(3*750/64))
+    batches = list(sampler)
+    assert sampler.epoch == 1
+    batch = np.concatenate(batches)
+    assert np.isin(batch, trainIdx).all()
+    classCts = pd.Series(df['class'].to_numpy()[batch]).value_counts()
+    assert (abs(classCts/len(batch) - 1/3) < 0.05).all()
+
+    # Reproducible, in any order, with or without prefetching.
+    sampler.epoch = 0
+    assert np.array_equal(sampler[5], batches[5])
+    prefetcher = BalancedBatchSampler(trainIdx, classes, batchSz=64, seed=3,
+                                      prefetch=4)
+    for expected, got in zip(batches, list(prefetcher)):
+        assert np.array_equal(expected, got)
+    assert prefetcher.epoch == 1
+    assert not np.array_equal(prefetcher[5], batches[5])
+    for i, batch in enumerate(prefetcher):
+        if i == 2:
+            break
+    # Breaking off the loop still ends the epoch.
+    assert prefetcher.epoch == 2
+
+    # An error making a batch on the prefetching thread is raised here,
+    # rather than leaving the loop waiting forever.
+    broken = BalancedBatchSampler(np.arange(100), np.arange(100) % 2,
+                                  batchSz=8, seed=3, X=np.zeros((10, 3)),
+                                  prefetch=2)
+    raised = False
+    try:
+        list(broken)
+    except IndexError:
+        raised = True
+    assert raised
+    assert broken.epoch == 1
+
+    X = sp.csr_matrix(df[['values']].to_numpy())
+    xyer = BalancedBatchSampler(trainIdx, classes, batchSz=64, seed=3, X=X,
+                                y=df['class'], targetClassSize=64)
+    assert len(xyer) == 3
+    xBatch, yBatch = xyer[5 % len(xyer)]
+    assert np.array_equal(xBatch.toarray().ravel(), batches[2])
+    assert np.array_equal(yBatch.to_numpy(),
+                          df['class'].to_numpy()[batches[2]])
+
+
 def testMoveValidationSubsets():
     myClassDirs = ['a', 'b', 'c']
     myHeadDir = './moveDataTest'
@@ -216,6 +462,122 @@ def testMoveValidationSubsets():
     assert expectedTest == testors
 
 
+def testRelocateFiles(tmp_path, capsys):
+    src = tmp_path / 'src'
+    src.mkdir()
+    sources = []
+    for i in range(10):
+        path = src / f"f-{i}.jpg"
+        path.write_text('' if i == 3 else f"f{i}")
+        sources.append(path)
+    dests = [tmp_path / 'dest' / path.name if i < 8 else None
+             for i, path in enumerate(sources)]
+
+    status, errors = relocateFiles(sources, dests, dryRun=True)
+    assert list(status) == ['done']*3 + ['empty'] + ['done']*4 + ['kept']*2
+    assert errors == []
+    assert all(path.exists() for path in sources)
+    assert not (tmp_path / 'dest').exists()
+    assert 'Would relocate 7 of 10 files' in capsys.readouterr().out
+
+    # An interrupted run: one source is missing, so the journal is kept.
+    journalPath = tmp_path / 'journal.jsonl'
+    sources[5].rename(tmp_path / 'f-5.jpg')
+    status, errors = relocateFiles(sources, dests, journalPath=journalPath,
+                                   batchSz=3, nWorkers=2)
+    assert status[5] == 'failed'
+    assert [err[0] for err in errors] == [str(sources[5])]
+    assert not sources[3].exists()
+    resumedSources, resumedDests, resumedStatus = \
+        readRelocationJournal(journalPath)
+    assert resumedSources == [str(path) for path in sources]
+    assert resumedDests[8:] == ['', '']
+    assert list(resumedStatus) == (['done']*3 + ['empty', 'done', '']
+                                   + ['done']*2 + ['kept']*2)
+
+    (tmp_path / 'f-5.jpg').rename(sources[5])
+    status, errors = relocateFiles(resumedSources, resumedDests,
+                                   journalPath=journalPath)
+    assert status[5] == 'done' and errors == []
+    assert list(status[3:5]) == ['empty', 'done']
+    assert not journalPath.exists()
+    assert sorted(p.name for p in (tmp_path / 'dest').iterdir()) == \
+        [f"f-{i}.jpg" for i in [0, 1, 2, 4, 5, 6, 7]]
+    assert (tmp_path / 'dest' / 'f-5.jpg').read_text() == 'f5'
+
+    copied, errors = relocateFiles([sources[8]], [tmp_path / 'copy.jpg'],
+                                   how='copy')
+    assert sources[8].exists() and (tmp_path / 'copy.jpg').exists()
+    linked, errors = relocateFiles([sources[8]], [tmp_path / 'copy.jpg'],
+                                   how='hardlink')
+    assert linked[0] == 'failed' and len(errors) == 1
+
+    # Tabs and newlines in file names survive the journal.
+    oddSources = [src / 'tab\tand\nnewline.jpg', src / 'missing.jpg']
+    oddSources[0].write_text('odd')
+    oddDests = [tmp_path / 'odd' / path.name for path in oddSources]
+    status, errors = relocateFiles(oddSources, oddDests,
+                                   journalPath=journalPath)
+    assert list(status) == ['done', 'failed']
+    journaled, journaledDests, journaledStatus = \
+        readRelocationJournal(journalPath)
+    assert journaled == [str(path) for path in oddSources]
+    assert journaledDests == [str(path) for path in oddDests]
+    assert list(journaledStatus) == ['done', '']
+    assert oddDests[0].read_text() == 'odd'
+
+
+def testSplitManifest(tmp_path):
+    myClassDirs = ['a', 'b', 'c']
+    head = tmp_path / 'data'
+    for classDir in myClassDirs:
+        classy = head / 'train' / classDir
+        classy.mkdir(parents=True)
+        for i in range(100):
+            (classy / f"{classDir}-{i:02d}.jpg").write_text(f"{classDir}{i}")
+    manifestPath = tmp_path / 'manifest.csv'
+
+    manifest = splitManifest(myClassDirs, headDir=head, testDir='test',
+                             validateFrac=0.20, testFrac=0.10,
+                             manifestPath=manifestPath)
+    counts = manifest.groupby(['class', 'split']).size()
+    assert (counts.xs('validation', level='split') == 20).all()
+    assert (counts.xs('test', level='split') == 10).all()
+    assert (counts.xs('train', level='split') == 70).all()
+    assert manifest['path'].str.startswith('train/').all()
+    assert loadManifest(manifestPath).equals(manifest)
+
+    # Same seed, same split, regardless of where the files currently are.
+    moved = splitManifest(myClassDirs, headDir=head, testDir='test',
+                          validateFrac=0.20, testFrac=0.10,
+                          manifestPath=manifestPath, mode='move')
+    assert moved['split'].equals(manifest['split'])
+    for className, file, split, path in moved.itertuples(index=False):
+        assert path == f"{split}/{className}/{file}"
+        assert (head / path).read_text() == file[0] + str(int(file[2:4]))
+    again = splitManifest(myClassDirs, headDir=head, testDir='test',
+                          validateFrac=0.20, testFrac=0.10, mode='move')
+    assert again.equals(moved)
+
+    # Adding files reassigns few of the old ones.
+    for i in range(100, 110):
+        (head / 'train' / 'a' / f"a-{i}.jpg").write_text(f"a{i}")
+    links = tmp_path / 'links'
+    linked = splitManifest(myClassDirs, headDir=head, testDir='test',
+                           validateFrac=0.20, testFrac=0.10,
+                           manifestPath=manifestPath, mode='hardlink',
+                           linkDir=links)
+    old = linked.merge(moved, on=['class', 'file'], suffixes=('', 'Old'))
+    assert np.count_nonzero(old['split'] != old['splitOld']) <= 4
+    for className, file, split, path in linked.itertuples(index=False):
+        assert (links / split / className / file).samefile(head / path)
+    assert sum(1 for f in links.glob('*/*/*.jpg')) == 310
+
+    manifestPath = tmp_path / 'manifest.npz'
+    saveManifest(linked, manifestPath)
+    assert loadManifest(manifestPath).equals(linked)
+
+
 def testCreateGloVeDict():
 
     GloVeDir = '/home/wilber/work/GloVe'
@@ -410,6 +772,123 @@ def testCreateGloVeDict():
     assert np.array_equal(expectedHypothesisVect, myGloVeDict['hypothesis'])
 
 
+def testGloVeStore(tmp_path):
+
+    randState = np.random.RandomState(5)
+    words = ['the', 'woman', 'dog', 'hypothesis']
+    vects = randState.randn(len(words), 50).astype('float32')
+    with open(tmp_path / 'glove.6B.050d.txt', 'w') as rawFile:
+        for word, vect in zip(words, vects):
+            rawFile.write(word + ' ' + ' '.join(f"{v:.5f}" for v in vect)
+                          + '\n')
+    expected = {}
+    for l in open(tmp_path / 'glove.6B.050d.txt'):
+        parts = l.split()
+        coeffs = np.asarray(parts[1:], dtype='float32')
+        expected[parts[0]] = coeffs/np.linalg.norm(coeffs)
+
+    myGloVeStore = GloVeDict(tmp_path, embeddingSz=50)
+    assert isinstance(myGloVeStore, GloVeStore)
+    assert (tmp_path / 'GloVe.6B.050normed.npy').exists()
+    assert not (tmp_path / 'GloVe.6B.050normed.pkl').exists()
+
+    myGloVeStore = GloVeDict(tmp_path, embeddingSz=50)
+    assert isinstance(myGloVeStore.vectors, np.memmap)
+    assert len(myGloVeStore) == len(words)
+    assert list(myGloVeStore) == words
+    assert 'dog' in myGloVeStore
+    assert 'cat' not in myGloVeStore
+    assert myGloVeStore.get('cat') is None
+    for word in words:
+        assert np.allclose(expected[word], myGloVeStore[word])
+        assert np.allclose(expected[word], myGloVeStore.get(word))
+
+    myGloVeDict = GloVeDict(tmp_path, embeddingSz=50, normed=False,
+                            memmap=False)
+    assert isinstance(myGloVeDict, dict)
+    assert (tmp_path / 'GloVe.6B.050.pkl').exists()
+
+    # An existing pickle is converted to a store, rather than re-parsed.
+    (tmp_path / 'glove.6B.050d.txt').unlink()
+    myGloVeStore = GloVeDict(tmp_path, embeddingSz=50, normed=False)
+    for word in words:
+        assert np.array_equal(myGloVeDict[word], myGloVeStore[word])
+
+
+def testReadGloVeText(tmp_path):
+
+    # Compares the chunked parser against the original line-by-line loop,
+    # on a synthetic file, and prints the timing of each.
+    randState = np.random.RandomState(7)
+    vocabSz, dim = 20000, 50
+    vects = randState.randn(vocabSz, dim).astype('float32')
+    rawPath = tmp_path / 'glove.6B.050d.txt'
+    with open(rawPath, 'w', encoding='utf-8') as rawFile:
+        for i, vect in enumerate(vects):
+            rawFile.write(f"w{i} " + ' '.join(f"{v:.5f}" for v in vect)
+                          + '\n')
+
+    t0 = timeit.default_timer()
+    expected = {}
+    for l in rawPath.open(encoding='utf-8'):
+        parts = l.split()
+        coeffs = np.asarray(parts[1:], dtype='float32')
+        expected[parts[0]] = coeffs/np.linalg.norm(coeffs)
+    t1 = timeit.default_timer()
+    vectors, words = readGloVeText(rawPath, chunkLines=3000, volubility=0)
+    t2 = timeit.default_timer()
+    print(f"line loop: {t1 - t0:6.3f}s\tchunked: {t2 - t1:6.3f}s")
+
+    assert vectors.shape == (vocabSz, dim)
+    assert words == list(expected.keys())
+    assert np.allclose(np.stack(list(expected.values())), vectors)
+
+    vectors, words = readGloVeText(rawPath, normed=False, volubility=0)
+    assert np.array_equal(np.asarray(words), [f"w{i}" for i in range(vocabSz)])
+    for i in randState.randint(0, vocabSz, size=100):
+        parts = f"w{i} " + ' '.join(f"{v:.5f}" for v in vects[i])
+        assert np.array_equal(np.asarray(parts.split()[1:], dtype='float32'),
+                              vectors[i])
+
+
+def testGloVeStoreLookupDocs():
+
+    randState = np.random.RandomState(11)
+    words = ['the', 'dog', 'ate', 'my', 'homework']
+    myGloVeStore = GloVeStore(randState.randn(5, 4).astype('float32'), words)
+    docs = [tokenizer.tokenize('The dog ate my xyzzy homework'),
+            tokenizer.tokenize('my dog'),
+            []]
+
+    X, oov, lengths = myGloVeStore.lookupDocs(docs)
+    assert X.shape == (3, 6, 4)
+    assert np.array_equal(lengths, [6, 2, 0])
+    assert np.array_equal(oov[0], [False, False, False, False, True, False])
+    assert not oov[1:].any()
+    for i, doc in enumerate(docs):
+        for j, token in enumerate(doc):
+            expected = myGloVeStore.get(token.lower(), np.zeros(4))
+            assert np.array_equal(expected, X[i, j])
+    assert not X[1, 2:].any() and not X[2].any()
+
+    X, oov, lengths = myGloVeStore.lookupDocs(docs, maxLen=3)
+    assert X.shape == (3, 3, 4)
+    assert np.array_equal(X[0], myGloVeStore.vectors[:3])
+
+    offsets, values, oov = myGloVeStore.lookupDocs(docs, ragged=True)
+    assert np.array_equal(offsets, [0, 6, 8, 8])
+    assert np.array_equal(oov, [0, 0, 0, 0, 1, 0, 0, 0])
+    assert np.array_equal(values[6:8], myGloVeStore.vectors[[3, 1]])
+    assert not values[4].any()
+
+    pooled = myGloVeStore.poolDocs(docs)
+    assert np.allclose(pooled[0], myGloVeStore.vectors.mean(axis=0))
+    assert np.allclose(pooled[1], myGloVeStore.vectors[[3, 1]].mean(axis=0))
+    assert not pooled[2].any()
+    pooled = myGloVeStore.poolDocs(docs, how='sum')
+    assert np.allclose(pooled[0], myGloVeStore.vectors.sum(axis=0))
+
+
 def testSparseUniq():
 
     a = np.array([[0, 5, 0, 0, 8, 0, 4, 0, 0, 8, 7, 0, 0, 0, 5],
@@ -461,6 +940,165 @@ def testSparseUniq():
     assert np.array_equal(inds, iExpected)
 
 
+def testSparseUniqEmpty():
+    spU, inds, inverse, counts = sparseUniq(sp.csr_matrix((0, 4)),
+                                            returnInverse=True,
+                                            returnCounts=True)
+    assert spU.shape == (0, 4)
+    assert len(inds) == len(inverse) == len(counts) == 0
+    spU, inds = sparseUniq(sp.coo_matrix((3, 0)), axis=1)
+    assert spU.shape == (3, 0) and spU.getformat() == 'coo'
+    assert len(inds) == 0
+
+
+def testSparseUniqMatchesLil(monkeypatch):
+
+    # Compares against the original LIL + np.unique version on a matrix with
+    # many repeated rows, and prints the timing of each.
+    randState = np.random.RandomState(17)
+    base = sp.random(3000, 200, density=0.03, format='csr',
+                     random_state=randState)
+    base.data = np.round(base.data*4)
+    base.eliminate_zeros()
+    rowIdx = randState.randint(0, base.shape[0], size=20000)
+    spM = base[rowIdx].tocoo()
+
+    t0 = timeit.default_timer()
+    lil = spM.tolil()
+    _, iExpected = np.unique(lil.data + lil.rows, return_index=True)
+    t1 = timeit.default_timer()
+    spU, inds, inverse, counts = sparseUniq(spM, returnInverse=True,
+                                            returnCounts=True)
+    t2 = timeit.default_timer()
+    print(f"LIL + np.unique: {t1 - t0:6.3f}s\thashed CSR: {t2 - t1:6.3f}s")
+
+    assert np.array_equal(inds, iExpected)
+    assert spU.getformat() == 'coo'
+    assert (spU.tocsr() != spM.tocsr()[iExpected]).nnz == 0
+    assert (spU.tocsr()[inverse] != spM.tocsr()).nnz == 0
+    assert np.array_equal(counts, np.bincount(inverse))
+    assert counts.sum() == spM.shape[0]
+
+    # Every row colliding must still give the exact result.
+    import DataSci
+    monkeypatch.setattr(DataSci, '_csrRowHashes',
+                        lambda m: np.zeros(m.shape[0], dtype='uint64'))
+    spU, inds = sparseUniq(spM.tocsr()[:2000])
+    lil = spM.tocsr()[:2000].tolil()
+    _, iExpected = np.unique(lil.data + lil.rows, return_index=True)
+    assert np.array_equal(inds, iExpected)
+
+
+def testDedupSparseShards(tmp_path):
+
+    randState = np.random.RandomState(18)
+    base = sp.random(300, 50, density=0.05, format='csr',
+                     random_state=randState)
+    base.data = np.round(base.data*3)
+    base.eliminate_zeros()
+    spM = base[randState.randint(0, base.shape[0], size=2000)]
+    _, inds, inverse = sparseUniq(spM, returnInverse=True)
+
+    shardPath = tmp_path / 'shard2.npz'
+    sp.save_npz(shardPath, spM[1200:])
+    indexPath = tmp_path / 'index.npz'
+    uniq, reps, index = dedupSparseShards([spM[:500], spM[500:1200]],
+                                          chunkSz=150, nWorkers=2,
+                                          indexPath=indexPath, volubility=0)
+    assert np.array_equal(reps, inds[inverse][:1200])
+    assert np.array_equal(uniq, np.unique(reps))
+    assert index.nRows == 1200 and len(index) == len(uniq)
+
+    # A later run continues the global numbering, and finds duplicates of
+    # the rows indexed before.
+    uniq, reps, index = dedupSparseShards([shardPath], chunkSz=300,
+                                          nWorkers=1, indexPath=indexPath,
+                                          volubility=0)
+    assert np.array_equal(reps, inds[inverse][1200:])
+    assert np.array_equal(uniq, np.setdiff1d(inds, np.arange(1200)))
+    assert SparseRowIndex.load(indexPath).nRows == 2000
+    assert len(SparseRowIndex.load(indexPath)) == len(inds)
+
+
+def testSparseRowIndex():
+
+    # Few distinct first hashes, so fingerprints often share them, with
+    # repeats within batches and across them, against a dict of the pairs.
+    randState = np.random.RandomState(19)
+    index = SparseRowIndex()
+    firsts = {}
+    for lo in range(0, 5000, 1000):
+        hashes = randState.randint(0, 30, 1000).astype('uint64')
+        salted = randState.randint(0, 50, 1000).astype('uint64')
+        rows = np.arange(lo, lo + 1000)
+        expected = [firsts.setdefault(key, row) for key, row in
+                    zip(zip(hashes.tolist(), salted.tolist()), rows.tolist())]
+        assert np.array_equal(index.add(hashes, salted, rows), expected)
+    assert len(index) == len(firsts)
+    for hashes, salted, ids in index.runs:
+        assert np.array_equal(np.lexsort((salted, hashes)),
+                              np.arange(len(ids)))
+    assert [len(run[2]) for run in index.runs] == \
+        sorted((len(run[2]) for run in index.runs), reverse=True)
+
+
+def testNearDuplicateClusters():
+
+    # Near-duplicates are made by replacing a few of each base row's
+    # columns. Recall is measured against brute-force Jaccard similarities
+    # of all pairs, and the timing of each is printed.
+    randState = np.random.RandomState(19)
+    nBase, nCols, rowSz = 1000, 20000, 40
+    rowCols = [randState.choice(nCols, rowSz, replace=False)
+               for i in range(nBase)]
+    for i in range(nBase):
+        for j in range(randState.randint(0, 3)):
+            cols = rowCols[i].copy()
+            replaced = randState.choice(rowSz, randState.randint(1, 4),
+                                        replace=False)
+            cols[replaced] = randState.randint(0, nCols, size=len(replaced))
+            rowCols.append(cols)
+    spM = sp.csr_matrix((np.ones(sum(len(c) for c in rowCols)),
+                         np.concatenate(rowCols),
+                         np.cumsum([0] + [len(c) for c in rowCols])),
+                        shape=(len(rowCols), nCols))
+    spM.sum_duplicates()
+
+    # Hashing in blocks of rows, bounded by maxBytes, changes nothing; nor
+    # do empty rows between the blocks.
+    withEmpty = sp.vstack([spM[:5], sp.csr_matrix((3, nCols)), spM[5:60]])
+    signatures = minHashSignatures(withEmpty, nPerm=32)
+    assert np.array_equal(minHashSignatures(withEmpty, nPerm=32,
+                                            maxBytes=8*16*100), signatures)
+    assert np.array_equal(minHashSignatures(withEmpty, nPerm=32,
+                                            maxBytes=1), signatures)
+    assert (signatures[5:8] == np.iinfo('uint32').max).all()
+
+    t0 = timeit.default_timer()
+    binary = spM.copy()
+    binary.data[:] = 1.0
+    intersections = (binary @ binary.T).toarray()
+    sizes = np.diff(binary.indptr)
+    jaccards = intersections/(sizes[:, None] + sizes[None, :]
+                              - intersections)
+    iExpected, jExpected = np.nonzero(np.triu(jaccards >= 0.8, k=1))
+    t1 = timeit.default_timer()
+    labels, clusters = nearDuplicateClusters(spM, threshold=0.8,
+                                             volubility=0)
+    t2 = timeit.default_timer()
+    recall = np.mean(labels[iExpected] == labels[jExpected])
+    print(f"brute force: {t1 - t0:6.3f}s\tMinHash LSH: {t2 - t1:6.3f}s"
+          f"\trecall: {recall:.3f} of {len(iExpected)} pairs")
+
+    assert len(iExpected) > 500
+    assert recall > 0.95
+    # Rows in a cluster are all linked by pairs above the threshold.
+    for cluster in clusters:
+        linked = jaccards[np.ix_(cluster, cluster)] >= 0.8
+        assert linked.sum(axis=1).min() > 1
+    assert labels[0] == 0 and np.all(np.diff(np.unique(labels)) == 1)
+
+
 def testNums2words():
     assert nums2words('') == ''
     assert nums2words('0') == 'zero'
@@ -473,9 +1111,32 @@ def testNums2words():
     assert nums2words('46') == 'fourty-six'
     assert nums2words('74') == 'seventy-four'
     assert nums2words('92`') == 'ninety-two'
-    # assert nums2words('392`') == 'three-ninety-two'
-    # assert nums2words('5397') == 'five-three-nine-seven'
-    # assert nums2words('1200') == 'twelve-hundred'
+    assert nums2words('30') == 'thirty'
+    assert nums2words('392`') == 'three-ninety'
+    assert nums2words('392`', precision=3) == 'three-ninety-two'
+    assert nums2words('305', precision=3) == 'three-oh-five'
+    assert nums2words('5397') == 'fifty-three-hundred'
+    assert nums2words('5397', precision=1) == 'five-thousand'
+    assert nums2words('5397', precision=3) == 'fifty-three-ninety'
+    assert nums2words('5397', precision=4) == 'fifty-three-ninety-seven'
+    assert nums2words('1200') == 'twelve-hundred'
+    assert nums2words('0007') == 'seven'
+    assert nums2words('12345', precision=3) == 'twelve-thousand-three-hundred'
+    assert nums2words('10000') == 'ten-thousand'
+    assert nums2words('1000000') == 'one-million'
+    assert nums2words('12345', precision=4) == \
+        'twelve-thousand-three-hundred-fourty'
+    assert nums2words('123456789', precision=3) == \
+        'one-hundred-twenty-three-million'
+    assert nums2words('1002345', precision=4) == 'one-million-two-thousand'
+    assert nums2words('12345678901234567890') == '12345678901234567890'
+    assert nums2words('x²') == 'x²'
+    assert nums2GloVeWords('3235') == 'thirty-two hundred'
+    assert nums2GloVeWords('3235', precision=4) == 'thirty-two thirty-five'
+    assert nums2GloVeWords('800 items') == 'eight hundred items'
+    assert nums2GloVeWords('46') == 'forty-six'
+    assert nums2GloVeWords('12345', precision=4) == \
+        'twelve thousand three hundred forty'
     srcStr = ('Wait! She said that there would be 200, or was it 2000, '
               'items in the ... store.')
     tstStr = ('wait she said that there would be two-hundred or was it '
@@ -487,6 +1148,75 @@ def testNums2words():
     assert nums2words(srcStr) == tstStr
 
 
+def testNumberWords():
+    numberWords = NumberWords(precision=3, bound=999)
+    assert len(numberWords.words) == 1000
+    assert numberWords['0392'] == 'three-ninety-two'
+    assert numberWords['5397'] == 'fifty-three-ninety'
+    assert numberWords['abc'] == 'abc'
+    assert nums2words('5397 - 6', numberWords=numberWords) == \
+        'fifty-three-ninety to six'
+
+    vocab = {'thirty-two', 'hundred', 'two-hundred', 'ninety', 'three'}
+    numberWords = NumberWords(glove=True, vocab=vocab)
+    assert numberWords['3235'] == 'thirty-two hundred'
+    assert numberWords['200'] == 'two-hundred'
+    assert numberWords['300'] == 'three hundred'
+    assert numberWords['95'] == 'ninety five'
+    assert nums2GloVeWords('About 3235', numberWords=numberWords) == \
+        'about thirty-two hundred'
+
+    # Words for tokens above bound are kept for the maxLarge used last.
+    numberWords = NumberWords(bound=99, maxLarge=2)
+    assert numberWords['120'] == 'one-twenty'
+    assert numberWords['5397'] == 'fifty-three-hundred'
+    assert numberWords['120'] == 'one-twenty'
+    assert numberWords['1000000'] == 'one-million'
+    assert list(numberWords._large) == ['120', '1000000']
+    numberWords = pickle.loads(pickle.dumps(numberWords))
+    assert numberWords['5397'] == 'fifty-three-hundred'
+    assert list(numberWords._large) == ['1000000', '5397']
+
+    raised = False
+    try:
+        NumberWords(precision=5)
+    except ValueError:
+        raised = True
+    assert raised
+
+
+def testNums2wordsBatch():
+
+    # Compares against Series.apply() of the scalar functions, on texts
+    # covering ranges, dashes, case and every kind of number, and prints
+    # the timing of each.
+    randState = np.random.RandomState(23)
+    pieces = ['Wait!', 'She', 'said', '200,', 'or', '2000', 'ITEMS', '...',
+              '2-13', '63–', '84', '100—300', '3 - 5', '4--5', 'x2 - 3',
+              '07', '30', '99', '0007', '120', '500', '1000', '10000',
+              '1000000', '01000', '12abc', 'a_1', '1_000', '—', '7 - b']
+    texts = pd.Series([' '.join(randState.choice(pieces, 12))
+                       for i in range(20000)] + [''], name='text')
+
+    t0 = timeit.default_timer()
+    expected = texts.apply(nums2words)
+    expectedGloVe = texts.apply(nums2GloVeWords)
+    t1 = timeit.default_timer()
+    converted = nums2wordsBatch(texts)
+    convertedGloVe = nums2wordsBatch(texts, glove=True)
+    t2 = timeit.default_timer()
+    print(f"apply: {t1 - t0:6.3f}s\tbatch: {t2 - t1:6.3f}s")
+
+    assert converted.equals(expected)
+    assert convertedGloVe.equals(expectedGloVe)
+    assert nums2wordsBatch(texts[:3].tolist()) == expected[:3].tolist()
+    pooled = nums2wordsBatch(texts.to_numpy(), nWorkers=2, chunkSz=3000)
+    assert np.array_equal(pooled, expected.to_numpy())
+    assert nums2wordsBatch([np.nan, '3 - 5'])[0] is np.nan
+    assert nums2wordsBatch(texts, precision=4).equals(
+        texts.apply(nums2words, precision=4))
+
+
 @timeUsage
 def sleeper(seconds):
     sleep(seconds)
@@ -0,0 +1,80 @@
+from GloVeIndex import *
+import numpy as np
+
+
+randState = np.random.RandomState(3)
+centers = randState.randn(20, 16)
+vects = (np.repeat(centers, 150, axis=0)
+         + 0.3*randState.randn(3000, 16)).astype('float32')
+vects /= np.linalg.norm(vects, axis=1, keepdims=True)
+words = [f"w{i}" for i in range(vects.shape[0])]
+
+
+def testExactTopK():
+    index = GloVeIndex(vects, words, blockSz=700)
+    queries = randState.randn(5, 16).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    inds, scores = index.exactTopK(queries, k=7)
+    expectedInds = np.argsort(-(queries @ vects.T), axis=1)[:, :7]
+    assert np.array_equal(inds, expectedInds)
+    assert np.allclose(scores, np.sort(queries @ vects.T, axis=1)[:, ::-1][:,
+                                                                          :7])
+
+    similar = index.mostSimilar('w10', k=5)
+    assert len(similar[0]) == 5
+    assert 'w10' not in [w for w, s in similar[0]]
+    expected = [f"w{i}" for i in np.argsort(-(vects @ vects[10]))[1:6]]
+    assert [w for w, s in similar[0]] == expected
+
+
+def testAnalogy():
+    a, b, c, d = np.eye(4, dtype='float32')
+    analogyVects = np.stack([a, b, c, (b - a + c)/np.sqrt(3.0),
+                             -a, np.ones(4, dtype='float32')/2.0])
+    index = GloVeIndex(analogyVects, ['a', 'b', 'c', 'd', 'e', 'f'])
+
+    answers = index.analogy('a', 'b', 'c', k=2)
+    assert [w for w, s in answers[0]] == ['d', 'e']
+
+
+def testIVF(tmp_path):
+    index = GloVeIndex(vects, words, blockSz=1000)
+    index.buildIVF(nLists=20, nIter=5, randomState=7, volubility=0)
+    assert index.listOffsets[-1] == vects.shape[0]
+    assert np.array_equal(np.sort(index.order), np.arange(vects.shape[0]))
+
+    queries = words[::100]
+    exactInds, _ = index.search(queries, k=10)
+    approxInds, _ = index.search(queries, k=10, exact=False, nProbe=20)
+    assert np.array_equal(exactInds, approxInds)
+
+    # Batched by cluster, the results must match scoring each query's own
+    # probed clusters separately.
+    Q = index._queryVectors(queries)
+    probes = np.argsort(-(Q @ index.centroids.T), axis=1)[:, :3]
+    approxInds, approxScores = index.approxTopK(Q, k=10, nProbe=3)
+    for q, probed, rowInds in zip(Q, probes, approxInds):
+        cands = np.flatnonzero(np.isin(
+            np.searchsorted(index.listOffsets, np.argsort(index.order),
+                            side='right') - 1, probed))
+        expected = cands[np.argsort(-(vects[cands] @ q), kind='stable')][:10]
+        assert np.array_equal(rowInds, expected)
+
+    emptyInds, emptyScores = index.search([], k=10, exact=False)
+    assert emptyInds.shape == (0, 10) and emptyScores.shape == (0, 10)
+    assert index.search([], k=10)[0].shape == (0, 10)
+
+    results = benchmarkIndex(index, queries, k=10, nProbes=(1, 3))
+    print(results)
+    assert results.loc[3, 'recall'] > 0.9
+
+    indexPath = indexPathFor(tmp_path / 'GloVe.6B.016normed.npy', 20)
+    assert indexPath.name == 'GloVe.6B.016normed.ivf20.npz'
+    index.save(indexPath)
+    loaded = GloVeIndex(vects, words)
+    loaded.load(indexPath)
+    assert np.array_equal(loaded.order, index.order)
+    approxInds2, _ = loaded.search(queries, k=10, exact=False, nProbe=3)
+    approxInds, _ = index.search(queries, k=10, exact=False, nProbe=3)
+    assert np.array_equal(approxInds, approxInds2)
@@ -1,5 +1,6 @@
 from symSpellPlus import *
 import numpy as np
+from symspellpy import Verbosity
 
 
 symSpell, vocab = initializeSymspell()
@@ -14,6 +15,20 @@ def testCategorizeWords():
     assert expected == actual
 
 
+def testCategorizeSentences():
+    sentences = [['All', 'the', 'best', 'people', 'understand', 'FOMO', ','],
+                 [],
+                 ['said', 'Mr', '.', 'Andersen', 'of', 'TwerkCo', '.'],
+                 ['Émile', 'ÉCOLE', 'straße', 'I', '']]
+
+    categories, offsets = categorizeSentences(sentences)
+    assert categories.dtype == np.int8
+    assert np.array_equal(offsets, [0, 7, 7, 14, 19])
+    assert np.array_equal(categories, [1, 0, 0, 0, 0, 2, 0,
+                                       0, 1, 0, 1, 0, 3, 0,
+                                       1, 2, 0, 2, 0])
+
+
 def testHas2VocabWords():
     # vocab = {'a', 'aardvark', 'busy', 'candid', 'lurch', 'toad', 'yes'}
 
@@ -47,3 +62,167 @@ def testSymSpellLine():
 #     expected = ("There ain't no way to figure out what this should be saying"
 #                 " according to the failing New York Times")
 #     actual = symSpellLines
+
+
+def testSymSpellDocStream():
+    docs = [("There ain't noway to figur eout what this hsould be saying. "
+             "accordin gto the fail ing New YorkTimes.\n\n"
+             "It hsould be xq zzv."),
+            "",
+            "She quickly recoveredand tried to hold her brains in."] * 3
+
+    stats = {}
+    actual = list(symSpellDocStream(iter(docs), nWorkers=2, batchSz=1,
+                                    maxPending=2, stats=stats))
+    expected = [symSpellDoc(symSpell, vocab, doc) for doc in docs]
+
+    assert actual == expected
+    assert stats['pages'] == len(docs)
+    assert stats['pagesPerSec'] > 0.0
+
+    # Empty documents submit no batches, but still count against
+    # maxPending: the stream must yield before reading far ahead.
+    read = []
+
+    def emptyDocs():
+        for i in range(100):
+            read.append(i)
+            yield ""
+
+    stream = symSpellDocStream(emptyDocs(), nWorkers=1, maxPending=3)
+    assert next(stream) == ""
+    assert len(read) <= 3
+    assert list(stream) == [""]*99
+
+
+def testSymspellSnapshot(tmp_path):
+    snapshotPath = tmp_path / 'symspell.pkl'
+    saveSymspellSnapshot(symSpell, vocab, snapshotPath)
+    loadedSymSpell, loadedVocab = initializeSymspell(snapshotPath)
+
+    assert loadedVocab == vocab
+    assert "ain't" in loadedVocab
+    assert loadedSymSpell.words == symSpell.words
+    assert loadedSymSpell.bigrams == symSpell.bigrams
+
+    sentence = ("There ain't noway to figur eout what this hsould be saying,"
+                " accordin gto the fail ing New YorkTimes.")
+    assert symSpellLine(loadedSymSpell, loadedVocab, sentence) == \
+        symSpellLine(symSpell, vocab, sentence)
+
+
+def testSymSpellDocStreamSnapshots(tmp_path):
+    # Each stream must use the snapshot it is given, not one loaded by an
+    # earlier stream.
+    otherSymSpell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+    for word in ['she', 'quickly', 'recovered', 'and', 'tried', 'to', 'hold',
+                 'her', 'brains', 'in']:
+        otherSymSpell.create_dictionary_entry(word, 1000)
+    otherVocab = set(otherSymSpell.words)
+    snapshotPath = tmp_path / 'symspell.pkl'
+    otherSnapshotPath = tmp_path / 'other.pkl'
+    saveSymspellSnapshot(symSpell, vocab, snapshotPath)
+    saveSymspellSnapshot(otherSymSpell, otherVocab, otherSnapshotPath)
+
+    docs = ["She quickly recoveredand tried to hold her brains in.",
+            "There ain't no way to figure out what this should be saying."]
+    expected = [symSpellDoc(symSpell, vocab, doc) for doc in docs]
+    otherExpected = [symSpellDoc(otherSymSpell, otherVocab, doc)
+                     for doc in docs]
+    assert expected != otherExpected
+
+    for path, expectedDocs in [(snapshotPath, expected),
+                               (otherSnapshotPath, otherExpected),
+                               (None, expected)]:
+        assert list(symSpellDocStream(docs, nWorkers=1,
+                                      snapshotPath=path)) == expectedDocs
+
+
+def testLRUCache():
+    cache = LRUCache(maxSize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)			# evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats() == {'entries': 2, 'weight': 2, 'hits': 2,
+                             'misses': 1, 'evictions': 1, 'hitRate': 2/3}
+
+    cache = LRUCache(maxSize=10, maxWeight=10, weigh=lambda k, v: len(v))
+    for key in ['a', 'b', 'c']:
+        cache.put(key, 'xxxx')
+    assert len(cache) == 2
+    assert cache.weight == 8
+
+
+def testSymSpellLineCache():
+    sentence = ("There ain't noway to figur eout what this hsould be saying,"
+                " accordin gto the fail ing New YorkTimes.")
+    cache = SymSpellCache(maxSentences=10, maxTokenized=10)
+
+    expected = symSpellLine(symSpell, vocab, sentence)
+    assert symSpellLine(symSpell, vocab, sentence, cache=cache) == expected
+    assert symSpellLine(symSpell, vocab, sentence.replace(' ', '  '),
+                        cache=cache) == expected
+    assert cache.sentences.hits == 1
+    assert cache.sentences.misses == 1
+
+    # A misspelling repeated in another sentence is looked up only once.
+    other = "It hsould be there, accordin gto them."
+    tokenMisses = cache.tokens.misses
+    assert symSpellLine(symSpell, vocab, other, cache=cache) == \
+        symSpellLine(symSpell, vocab, other)
+    assert cache.tokens.hits > 0
+    assert cache.tokens.misses - tokenMisses < len(other.split())
+    assert set(cache.stats()) == {'sentences', 'tokenized', 'tokens'}
+
+    # A real SymSpell, sharing the dictionaries, and leaving symSpell as is.
+    cached = cache.lookups(symSpell)
+    assert isinstance(cached, SymSpell)
+    assert cached.words is symSpell.words
+    assert not hasattr(symSpell, '_tokenCache')
+    assert [s.term for s in cached.lookup('hsould', Verbosity.CLOSEST)] == \
+        [s.term for s in symSpell.lookup('hsould', Verbosity.CLOSEST)]
+
+    cache = SymSpellCache(maxChars=100)
+    symSpellLine(symSpell, vocab, sentence, cache=cache)
+    symSpellLine(symSpell, vocab, other, cache=cache)
+    assert all(0 < c.weight <= 100 for c in [cache.sentences, cache.tokenized,
+                                              cache.tokens])
+
+
+def testVocabPrefilter():
+    prefilter = VocabPrefilter(vocab)
+    sentences = ['there is no way to figure out what this should be',
+                 'There is no way to figure out what this should be',
+                 'there is noway to figur eout what this hsould be',
+                 'there is no way, as they say',
+                 '']
+
+    assert np.array_equal(prefilter.inVocab(sentences),
+                          [True, False, False, False, True])
+    assert np.array_equal(prefilter.vocabCounts(sentences),
+                          [11, 11, 7, 7, 0])
+
+    # Words in vocab that word_tokenize() splits, into words that may not
+    # be, aren't clean.
+    splits = ['we are gonna figure it out', 'we cannot figure it out']
+    assert all(w in vocab for sent in splits for w in sent.split())
+    assert not prefilter.inVocab(splits).any()
+    sentences += splits
+
+    expected = [symSpellLine(symSpell, vocab, sent) for sent in sentences]
+    actual = symSpellLines(symSpell, vocab, sentences, prefilter=prefilter)
+    assert actual == expected
+
+    expected = [symSpellSentence(symSpell, vocab, sent) for sent in sentences]
+    actual = symSpellSentences(symSpell, vocab, sentences,
+                               prefilter=prefilter)
+    assert actual == expected
+
+    doc = ("there is no way to figure out what this should be. It hsould be "
+           "xq zzv.\n\nShe quickly recoveredand tried to hold her brains "
+           "in. she tried")
+    assert symSpellDoc(symSpell, vocab, doc, prefilter=prefilter) == \
+        symSpellDoc(symSpell, vocab, doc)
@@ -0,0 +1,84 @@
+from timing import *
+import json
+import timeit
+import numpy as np
+from numpy.random import RandomState
+
+
+def testFormatDuration():
+    assert formatDuration(2.154) == "Δt:  2.15s."
+    assert formatDuration(125.0) == "Δt: 2m,  5.0s."
+    assert formatDuration(3725.0) == "Δt: 1h, 2m,  5.0s."
+    assert formatDuration(90061.0) == "Δt: 1.0d, 1h, 1m,  1.0s."
+
+
+def testTimingRegistry(tmp_path):
+    registry = TimingRegistry()
+    Δts = RandomState(23).lognormal(-5, 1.5, 100000)
+    for Δt in Δts:
+        registry.record('lognormal', Δt)
+    registry.record('once', 0.5)
+
+    percentiles = registry.percentiles('lognormal', [1, 50, 95, 99, 100])
+    exact = np.percentile(Δts, [1, 50, 95, 99, 100])
+    assert np.all(np.abs(percentiles/exact - 1) < 0.06)
+    assert percentiles[-1] == Δts.max()
+
+    summary = registry.summary()
+    assert list(summary.columns) == ['calls', 'total', 'mean', 'min', 'max',
+                                     'p50', 'p95', 'p99']
+    assert list(summary.index) == ['lognormal', 'once']
+    assert summary.loc['lognormal', 'calls'] == len(Δts)
+    assert np.isclose(summary.loc['lognormal', 'total'], Δts.sum())
+    assert summary.loc['lognormal', 'min'] == Δts.min()
+    assert np.allclose(summary.loc['once', ['mean', 'p50', 'p99']], 0.5)
+
+    jsonPath = tmp_path / 'timings.json'
+    summaryJSON = registry.toJSON(jsonPath)
+    assert jsonPath.read_text() == summaryJSON
+    assert json.loads(summaryJSON)['once']['calls'] == 1
+
+    registry.reset()
+    assert len(registry.summary()) == 0
+
+
+def testTimeUsageRegistry(capsys):
+    registry = TimingRegistry(quiet=True)
+
+    @timeUsage(registry=registry)
+    def quietSum(n):
+        return sum(range(n))
+
+    @timeUsage(registry=registry, quiet=False)
+    def loudSum(n):
+        return sum(range(n))
+
+    assert quietSum(10) == 45
+    assert capsys.readouterr().out == ""
+    assert loudSum(10) == 45
+    assert capsys.readouterr().out.startswith("Δt: ")
+    assert quietSum.__name__ == 'quietSum'
+
+    # Overhead of recording, per call, against the undecorated function:
+    # best of 10 runs of 1000 calls each, bounded generously, so that the
+    # test only fails if recording gets far slower (a few µs, typically).
+    timed = timeit.repeat(lambda: quietSum(10), number=1000, repeat=10)
+    bare = timeit.repeat(lambda: quietSum.__wrapped__(10), number=1000,
+                         repeat=10)
+    overhead = (min(timed) - min(bare))/1000
+    assert overhead < 50e-6
+
+    summary = registry.summary()
+    name = f"{quietSum.__module__}.{quietSum.__qualname__}"
+    assert summary.loc[name, 'calls'] == 10001
+    assert summary.loc[name, 'min'] <= summary.loc[name, 'p50'] \
+        <= summary.loc[name, 'p99'] <= summary.loc[name, 'max']
+
+    @timeUsage
+    def defaultSum(n):
+        return sum(range(n))
+
+    defaultSum(10)
+    assert capsys.readouterr().out.startswith("Δt: ")
+    name = f"{defaultSum.__module__}.{defaultSum.__qualname__}"
+    assert timingRegistry.summary().loc[name, 'calls'] == 1
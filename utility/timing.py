@@ -0,0 +1,207 @@
+import json
+import math
+import timeit
+import threading
+import numpy as np
+import pandas as pd
+from functools import wraps
+
+
+def formatDuration(Δt):
+    """
+    INPUT:
+        Δt		float, duration in seconds
+
+    RETURNS:
+        str, e.g. "Δt:  2.15s.", with formats differing for cases < 1 min,
+                < 1 hour, < 1 day and >= 1 day
+    """
+
+    if Δt > 86400.0:
+        return (f"Δt: {Δt//86400}d, {int((Δt % 86400)//3600)}h, "
+                f"{int((Δt % 3600)//60)}m, {Δt % 60.0:4.1f}s.")
+    elif Δt > 3600.0:
+        return (f"Δt: {int(Δt//3600)}h, {int((Δt % 3600)//60)}m, "
+                f"{Δt % 60.0:4.1f}s.")
+    elif Δt > 60.0:
+        return f"Δt: {int(Δt//60)}m, {Δt % 60.0:4.1f}s."
+    return f"Δt: {Δt % 60.0:5.2f}s."
+
+
+class TimingRegistry:
+    """
+    INPUT:
+        binsPerDecade	int, resolution of the duration histograms,
+                        default: 40
+        minΔt		float, seconds, lower edge of the histograms; shorter
+                        calls are counted in the first bin, default: 1e-6
+        maxΔt		float, seconds, upper edge of the histograms; longer
+                        calls are counted in the last bin, default: 1e6
+        quiet		bool, if True, timeUsage() functions recording here
+                        don't print their durations, default: False
+
+    In-process record of the calls to timeUsage() functions: for each
+    function, the call count, total, min and max durations are exact, and
+    percentiles come from a histogram with log-spaced bins, so recording a
+    call is a few arithmetic operations under a lock, and memory doesn't
+    grow with the number of calls. Percentiles are interpolated within
+    their bin, so are within a factor of 10**(1/binsPerDecade) (about 6%,
+    by default) of the exact ones, and are clipped to [min, max].
+    """
+
+    def __init__(self, binsPerDecade=40, minΔt=1e-6, maxΔt=1e6,
+                 quiet=False):
+        self.binsPerDecade = binsPerDecade
+        self.minΔt = minΔt
+        self.log10Min = math.log10(minΔt)
+        self.nBins = int(np.ceil((math.log10(maxΔt) - self.log10Min)
+                                 * binsPerDecade))
+        self.quiet = quiet
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, Δt):
+        """
+        INPUT:
+            name	str, of the function called
+            Δt		float, seconds the call took
+        """
+
+        if Δt > self.minΔt:
+            b = min(int((math.log10(Δt) - self.log10Min)*self.binsPerDecade),
+                    self.nBins - 1)
+        else:
+            b = 0
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = {'calls': 0, 'total': 0.0,
+                                               'min': Δt, 'max': Δt,
+                                               'hist': [0]*self.nBins}
+            timing['calls'] += 1
+            timing['total'] += Δt
+            timing['min'] = min(timing['min'], Δt)
+            timing['max'] = max(timing['max'], Δt)
+            timing['hist'][b] += 1
+
+    def percentiles(self, name, percentiles=(50, 95, 99)):
+        """
+        INPUT:
+            name		str, of a function recorded
+            percentiles	sequence of float, in [0, 100],
+                            default: (50, 95, 99)
+
+        RETURNS:
+            np.ndarray(type=float), seconds, the estimated percentiles of
+                    the durations of the calls to name
+        """
+
+        with self.lock:
+            timing = self.timings[name]
+            hist = np.array(timing['hist'], dtype='float64')
+            lo, hi = timing['min'], timing['max']
+        cumulative = np.cumsum(hist)
+        ranks = np.asarray(percentiles, dtype='float64')/100*cumulative[-1]
+        b = np.minimum(np.searchsorted(cumulative, ranks, side='left'),
+                       self.nBins - 1)
+        below = cumulative[b] - hist[b]
+        within = np.clip((ranks - below)/np.maximum(hist[b], 1), 0, 1)
+        log10Δts = self.log10Min + (b + within)/self.binsPerDecade
+        return np.clip(10**log10Δts, lo, hi)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """
+        INPUT:
+            percentiles	sequence of float, in [0, 100],
+                            default: (50, 95, 99)
+
+        RETURNS:
+            pd.DataFrame, indexed by function name, with columns calls,
+                    total, mean, min, max and 'p50'-style percentiles (in
+                    seconds), most total time first
+        """
+
+        with self.lock:
+            names = list(self.timings)
+            rows = [{k: v for k, v in self.timings[name].items()
+                     if k != 'hist'} for name in names]
+        summary = pd.DataFrame(rows, index=pd.Index(names, name='function'),
+                               columns=['calls', 'total', 'min', 'max'])
+        summary.insert(2, 'mean', summary.total/summary.calls)
+        for p in percentiles:
+            summary[f"p{p:g}"] = np.nan
+        for name in names:
+            summary.loc[name, [f"p{p:g}" for p in percentiles]] = \
+                self.percentiles(name, percentiles)
+        return summary.sort_values('total', ascending=False)
+
+    def toJSON(self, path=None, percentiles=(50, 95, 99)):
+        """
+        INPUT:
+            path		str or Path, file to write to, default: None
+            percentiles	sequence of float, as for summary(),
+                            default: (50, 95, 99)
+
+        RETURNS:
+            str, JSON object of the summary(), keyed by function name
+        """
+
+        summaryJSON = json.dumps(self.summary(percentiles).to_dict('index'),
+                                 indent=2)
+        if path is not None:
+            with open(path, 'w') as jsonFile:
+                jsonFile.write(summaryJSON)
+        return summaryJSON
+
+    def reset(self):
+        """
+        Forgets all the calls recorded.
+        """
+
+        with self.lock:
+            self.timings = {}
+
+
+# Registry timeUsage() functions record in, unless given another.
+timingRegistry = TimingRegistry()
+
+
+def timeUsage(func=None, registry=None, quiet=None):
+    """
+    INPUT:
+        func		obj, function you want timed
+        registry	TimingRegistry, to record calls in, default: None,
+                        for timingRegistry
+        quiet		bool, if True, don't print durations, or, if False,
+                        print them, whatever registry.quiet is,
+                        default: None, for registry.quiet
+
+    This is a decorator that prints out the duration of execution for a
+    function. Formats differ for cases < 1 min, < 1 hour, < 1 day and
+    >= 1 day. Every call is also recorded, under the function's module and
+    qualified name, in registry, from which timingRegistry.summary() gives
+    a DataFrame of the calls so far. Use as @timeUsage, or with options, as
+    @timeUsage(quiet=True).
+    """
+
+    if func is None:
+        return lambda func: timeUsage(func, registry, quiet)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def _timeUsage(*args, **kwds):
+
+        t0 = timeit.default_timer()
+
+        retval = func(*args, **kwds)
+
+        t1 = timeit.default_timer()
+        Δt = t1 - t0
+        calls = timingRegistry if registry is None else registry
+        calls.record(name, Δt)
+        if not (calls.quiet if quiet is None else quiet):
+            print(formatDuration(Δt))
+        return retval
+
+    return _timeUsage